@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+
+import os
+import time
+import argparse
+import traceback
+import contextlib
+import multiprocessing
+import concurrent.futures
+from parse_model import get_packages_from_xmi
+from progress import PROGRESS_MODES, set_progress_mode
+import secra
+
+################################
+# BATCH ANALYSIS
+# the xmi is parsed once (see get_packages_from_xmi) and every package with at
+# least an agent is analyzed (see analyze in secra.py) by a pool of worker
+# processes. The outputs of all the packages are in the same directory (their
+# files are prefixed by the name of the package, the model and subgraph caches
+# are shared), the messages of the analysis of a package in <package>.log.
+# The summary, with the runtime, the risk and the nogoods (with conflict_learning)
+# of each package, is printed and written in <output>/batch_summary.out
+################################
+SUMMARY_COLUMNS=[('package','spec_package'),('agents','agents'),('pairs','num_pairs'),('subgraphs','subgraphs'),('cyclic','cyclic'),('risk','risk'),('nogoods learned/hits/misses','nogoods'),('seconds','seconds')]
+
+#runs in a worker: returns the row of the package in the summary, with the weights
+#of the relations of the pairs ({relation:{"region,region":direct weight}}) as the results
+#of analyze have Z3 terms, which cannot be sent back to the main process.
+#theory is the one of the worker (see daemon.py), if None analyze declares it
+def analyze_package(xmi_filename, spec_package, components_flows, path, options, progress, theory=None, solvers=None):
+    set_progress_mode(progress)
+    start=time.time()
+    agents=sum(1 for c in components_flows['components'].values() if c['type']=="agent")
+    row={'spec_package':spec_package,'agents':agents,'num_pairs':None,'subgraphs':None,'cyclic':None,'risk':None,'nogoods':None,'weights':None,'seconds':None,'error':None}
+    with open(os.path.join(path,spec_package+".log"),"w") as log, contextlib.redirect_stdout(log):
+        try:
+            results=secra.analyze(xmi_filename,spec_package,path,options,theory=theory,components_flows=components_flows,solvers=solvers)
+            row['num_pairs']=results['num_pairs']
+            row['subgraphs']=len(results['subgraphs'])
+            row['cyclic']=len(results['cyclic'])
+            row['risk']=results['risk']
+            row['nogoods']=results['nogoods']
+            row['weights']={relation:{"%s,%s"%pair:entry['direct_weight'] for pair,entry in pairs.items()} for relation,pairs in results['risk_structure'].items()}
+        #create_regions_from_xmi exits on the flows it does not support
+        except (Exception,SystemExit) as e:
+            traceback.print_exc(file=log)
+            row['error']="%s: %s"%(type(e).__name__,e)
+    row['seconds']=time.time()-start
+    return row
+
+#analyzes the packages (all of them if None) of xmi_filename with workers processes
+#(one per cpu if None) and returns the rows of the summary, in the order of the xmi
+def run_batch(xmi_filename, path, packages=None, workers=None, options=None, progress="silent"):
+    start=time.time()
+    if not os.path.exists(path):
+        os.makedirs(path)
+    parsed=get_packages_from_xmi(xmi=xmi_filename)
+    parse_time=time.time()-start
+    print("Parsed %d packages of %s in %.3fs"%(len(parsed),xmi_filename,parse_time))
+    for name in packages or []:
+        if(name not in parsed):
+            print("WARNING package %s not found (or without agents) in %s"%(name,xmi_filename))
+    names=[name for name in parsed if packages is None or name in packages]
+
+    rows={}
+    # fork: the workers inherit the imported modules and the parsed packages are sent to them
+    pool_context=multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=pool_context) as pool:
+        futures=[pool.submit(analyze_package, xmi_filename, name, parsed[name], path, options, progress) for name in names]
+        for future in concurrent.futures.as_completed(futures):
+            row=future.result()
+            rows[row['spec_package']]=row
+            if(row['error'] is None):
+                print("%s analyzed in %.3fs (risk %d)"%(row['spec_package'],row['seconds'],row['risk']))
+            else:
+                print("%s FAILED in %.3fs: %s (see %s.log)"%(row['spec_package'],row['seconds'],row['error'],row['spec_package']))
+    summary=[rows[name] for name in names]
+    write_summary(os.path.join(path,"batch_summary.out"), xmi_filename, summary, parse_time, time.time()-start)
+    return summary
+
+def summary_table(summary):
+    cells=[[name for name,key in SUMMARY_COLUMNS]]
+    for row in summary:
+        line=[]
+        for name,key in SUMMARY_COLUMNS:
+            if(key=='seconds'):
+                line.append("%.3f"%row[key])
+            elif(key=='risk' and row['error'] is not None):
+                line.append("ERROR")
+            elif(key=='nogoods' and row[key] is not None):
+                line.append("%d/%d/%d"%(row[key]['learned'],row[key]['hits'],row[key]['misses']))
+            else:
+                line.append("" if row[key] is None else str(row[key]))
+        cells.append(line)
+    widths=[max(len(line[i]) for line in cells) for i in range(len(SUMMARY_COLUMNS))]
+    return "\n".join("  ".join(cell.ljust(width) for cell,width in zip(line,widths)).rstrip() for line in cells)
+
+def write_summary(filename, xmi_filename, summary, parse_time, seconds):
+    with open(filename,"w") as f:
+        f.write("xmi: %s\npackages: %d\nparse time: %.3fs\ntotal time: %.3fs\n\n"%(xmi_filename,len(summary),parse_time,seconds))
+        f.write(summary_table(summary)+"\n")
+        for row in summary:
+            if(row['error'] is not None):
+                f.write("\n%s: %s\n"%(row['spec_package'],row['error']))
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Cybersecurity risk assessment of every package of an xmi (with the configuration of secra.py)")
+    parser.add_argument("--xmi", default=secra.xmi_filename, help="the exported xmi (default %(default)s)")
+    parser.add_argument("--output", default=os.path.join("./","output_secra"), help="the output directory (default %(default)s)")
+    parser.add_argument("--packages", nargs="+", default=None, help="the packages to analyze (default all the packages with agents)")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default one per cpu)")
+    parser.add_argument("--progress", choices=PROGRESS_MODES, default="silent", help="how the progress of each analysis is shown in its log (default %(default)s)")
+    args=parser.parse_args()
+    summary=run_batch(args.xmi, args.output, args.packages, args.workers, progress=args.progress)
+    print()
+    print(summary_table(summary))
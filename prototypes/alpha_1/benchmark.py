@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+#benchmarks of the analysis on synthetic models
+#usage: python3 benchmark.py <benchmark> [args]
+
+import os
+import sys
+import time
+import tempfile
+from z3 import *
+from rcc5_theory import RCC5_RELATIONS, declare_theory, add_minimal_subregions, rcc_five, tracked_solver
+from scenarios import check_scenarios
+from parse_model import get_components_from_xmi
+from rcc5_counting import count_scenarios
+from graph_decomposition import biconnected_blocks
+from checkpoint import new_checkpoint
+from manifest import new_manifest
+from progress import set_progress_mode
+import secra
+
+#a cyclic subgraph A0 -- B1 -- A2 -- ... -- A0 with num_pairs pairs
+def synthetic_cycle(theory, num_pairs):
+    regions=[]
+    for i in range(num_pairs):
+        regions.append(Const(("A" if i%2==0 else "B")+str(i),theory['Base']))
+    pairs={}
+    for i in range(num_pairs):
+        pairs[regions[i]]=[regions[(i+1)%num_pairs]]
+    return pairs
+
+#per-check latency of the product enumeration with push/add/check/pop
+#(a new formula per scenario) and with pre-built assumption literals
+def benchmark_assumptions(num_pairs=3, num_scenarios=125):
+    theory=declare_theory()
+    pairs=synthetic_cycle(theory, num_pairs)
+    print("cycle of %d pairs, first %d scenarios"%(num_pairs,num_scenarios))
+    for assumptions in (False, True):
+        solver=Solver()
+        regions_subregions_pairs=add_minimal_subregions(pairs,solver,theory['Base'],theory['P'])
+        rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), theory['P'], theory['O'], theory['EQ'], theory['PP'], theory['PO'], theory['PPi'], theory['DR'], progress=False)
+        with open(os.devnull,"w") as f:
+            start=time.time()
+            result=check_scenarios(solver, theory, regions_subregions_pairs['pairs_array'], 0, num_scenarios, f, progress=False, assumptions=assumptions)
+            total=time.time()-start
+        print("%-12s sat=%d unsat=%d checks=%d avg check latency=%.6fs avg scenario=%.6fs"%("assumptions" if assumptions else "push/pop",result['counter_sat'],result['counter_unsat'],result['checks'],result['check_time']/result['checks'],total/num_scenarios))
+
+#time to build the theory and per-check latency with the tracked theory
+#and without tracking (the unsat cores are taken from a tracked solver)
+def benchmark_tracking(num_pairs=4, num_scenarios=125):
+    theory=declare_theory()
+    pairs=synthetic_cycle(theory, num_pairs)
+    print("cycle of %d pairs, first %d scenarios"%(num_pairs,num_scenarios))
+    for track in (True, False):
+        solver=Solver()
+        start=time.time()
+        regions_subregions_pairs=add_minimal_subregions(pairs,solver,theory['Base'],theory['P'],track)
+        rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), theory['P'], theory['O'], theory['EQ'], theory['PP'], theory['PO'], theory['PPi'], theory['DR'], progress=False, track=track)
+        build=time.time()-start
+        with open(os.devnull,"w") as f:
+            start=time.time()
+            result=check_scenarios(solver, theory, regions_subregions_pairs['pairs_array'], 0, num_scenarios, f, progress=False, core_solver=None if track else tracked_solver(pairs, theory))
+            total=time.time()-start
+        print("%-10s build=%.3fs sat=%d unsat=%d avg check latency=%.6fs avg scenario=%.6fs"%("tracked" if track else "untracked",build,result['counter_sat'],result['counter_unsat'],result['check_time']/result['checks'],total/num_scenarios))
+
+#an xmi with the ABF-theory and a package Synthetic of num_agents agents in a ring,
+#each with an input and an output port (and their sockets) and a flow from
+#its output port to the input port of the next agent
+def synthetic_xmi(filename, num_agents):
+    xmi="xmi:type"
+    with open(filename,"w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?><uml:Model xmlns:uml="http://www.omg.org/spec/UML/20110701" xmlns:xmi="http://schema.omg.org/spec/XMI/2.1" xmi:version="2.1" xmi:id="model" name="Engineering">\n')
+        f.write(' <packagedElement %s="uml:Package" xmi:id="abf" name="ABFTheory">\n'%xmi)
+        for t in ("Fact","Belief","Assertion","Base"):
+            f.write('  <packagedElement %s="uml:Class" xmi:id="%s" name="%s"/>\n'%(xmi,t,t))
+        f.write(' </packagedElement>\n')
+        for t in ("InputPort","OutputPort","FunctionalBlock"):
+            f.write(' <packagedElement %s="uml:Class" xmi:id="%s" name="%s"/>\n'%(xmi,t,t))
+        f.write(' <packagedElement %s="uml:Package" xmi:id="spec" name="Synthetic">\n'%xmi)
+        for i in range(num_agents):
+            f.write('  <packagedElement %s="uml:Node" xmi:id="n%d" name="agent%d">\n'%(xmi,i,i))
+            f.write('   <ownedAttribute %s="uml:Port" xmi:id="i%d" name="in%d" type="InputPort"/>\n'%(xmi,i,i))
+            f.write('   <ownedAttribute %s="uml:Port" xmi:id="o%d" name="out%d" type="OutputPort"/>\n'%(xmi,i,i))
+            f.write('   <ownedAttribute %s="uml:Property" xmi:id="is%d" name="in%d" type="InputPort"/>\n'%(xmi,i,i))
+            f.write('   <ownedAttribute %s="uml:Property" xmi:id="os%d" name="out%d" type="OutputPort"/>\n'%(xmi,i,i))
+            f.write('   <ownedAttribute %s="uml:Property" xmi:id="b%d" name="base%d" type="Base"/>\n'%(xmi,i,i))
+            f.write('  </packagedElement>\n')
+        for i in range(num_agents):
+            f.write('  <packagedElement %s="uml:InformationFlow" xmi:id="f%d" informationSource="o%d" informationTarget="i%d"/>\n'%(xmi,i,i,(i+1)%num_agents))
+        f.write(' </packagedElement>\n</uml:Model>\n')
+
+#time to parse synthetic models (parse) and to link ports, sockets and
+#channels (link) doubling the number of agents (2 ports each) steps times
+def benchmark_parsing(num_agents=1000, steps=4):
+    with tempfile.TemporaryDirectory() as tmp:
+        for step in range(steps):
+            filename=os.path.join(tmp,"synthetic.xmi")
+            synthetic_xmi(filename, num_agents)
+            start=time.time()
+            components_flows=get_components_from_xmi("Synthetic",xmi=filename)
+            total=time.time()-start
+            parse=components_flows['stats']['parse_time']
+            print("agents=%-7d ports=%-7d components=%-7d parse=%.3fs link=%.3fs link per port=%.2fus"%(num_agents,2*num_agents,len(components_flows['components']),parse,total-parse,1e6*(total-parse)/(2*num_agents)))
+            num_agents*=2
+
+#sat scenarios of cycles counted on their tree decomposition (see rcc5_counting.py)
+#and, up to max_enumerated pairs, enumerated (decided by the closure, without Z3)
+def benchmark_counting(num_pairs=3, steps=4, max_enumerated=6):
+    theory=declare_theory()
+    for step in range(steps):
+        pairs=synthetic_cycle(theory, num_pairs)
+        pairs_array=add_minimal_subregions(pairs,Solver(),theory['Base'],theory['P'],False)['pairs_array']
+        start=time.time()
+        counts=count_scenarios(pairs_array)
+        line="pairs=%-4d width=%d sat=%d counted=%.3fs"%(num_pairs,counts['width'],counts['counter_sat'],time.time()-start)
+        if(num_pairs<=max_enumerated):
+            num_scenarios=len(RCC5_RELATIONS)**num_pairs
+            with open(os.devnull,"w") as f:
+                start=time.time()
+                result=check_scenarios(Solver(), theory, pairs_array, 0, num_scenarios, f, progress=False, prefilter="closure")
+                line+=" enumerated=%.3fs (sat=%d)"%(time.time()-start,result['counter_sat'])
+        print(line)
+        num_pairs*=2
+
+#num_triangles triangles sharing the region A0: its blocks are enumerated by analyze_block
+#(secra.py) one after the other on the same solver with the tracked theory, and the
+#product of their sat scenarios is compared with the sat scenarios of the whole subgraph
+#(counted on its tree decomposition, without Z3)
+def benchmark_blocks(num_triangles=2):
+    theory=declare_theory()
+    center=Const("A0",theory['Base'])
+    pairs={center:[]}
+    for i in range(num_triangles):
+        b=Const("B%d"%(2*i+1),theory['Base'])
+        c=Const("B%d"%(2*i+2),theory['Base'])
+        pairs[center].append(b)
+        pairs[b]=[c]
+        pairs[c]=[center]
+    options=secra.default_options()
+    options.update({'track_theory':True,'path_consistency':"filter",'scenario_log_format':"text",'subgraph_cache':False,'incremental':False})
+    set_progress_mode("silent")
+    with tempfile.TemporaryDirectory() as tmp, open(os.path.join(tmp,"Blocks.out"),"w") as f:
+        analysis={'spec_package':"Blocks",'path':tmp,'options':options,'theory':theory,'solver':Solver(),'solvers':None,'f':f,'log':None,
+            'checkpoint':new_checkpoint("Blocks"),'checkpoint_file':os.path.join(tmp,"Blocks.checkpoint.json"),'cache_dir':None,'cache_memory':{},
+            'previous_manifest':new_manifest("Blocks"),'manifest':new_manifest("Blocks"),'reuse':{'unchanged':0,'isomorphic':0,'analyzed':0},'nogoods':{'learned':0,'hits':0,'misses':0}}
+        blocks=biconnected_blocks(pairs)
+        start=time.time()
+        sat=1
+        for i,block in enumerate(blocks):
+            sat*=secra.analyze_block(analysis, "block %d"%(i+1), block, "_b%d"%(i+1))['result']['counter_sat']
+        blocks_time=time.time()-start
+    pairs_array=add_minimal_subregions(pairs,Solver(),theory['Base'],theory['P'],False)['pairs_array']
+    start=time.time()
+    counts=count_scenarios(pairs_array)
+    print("triangles=%d blocks=%d sat=%d (tracked, %.3fs) whole sat=%d (counted, %.3fs) %s"%(num_triangles,len(blocks),sat,blocks_time,counts['counter_sat'],time.time()-start,"OK" if sat==counts['counter_sat'] else "MISMATCH"))
+
+BENCHMARKS={'assumptions':benchmark_assumptions,'tracking':benchmark_tracking,'parsing':benchmark_parsing,'counting':benchmark_counting,'blocks':benchmark_blocks}
+
+if __name__ == "__main__":
+    if(len(sys.argv)<2 or sys.argv[1] not in BENCHMARKS):
+        print("usage: python3 benchmark.py [%s] [args]"%"|".join(BENCHMARKS))
+        sys.exit(1)
+    BENCHMARKS[sys.argv[1]](*[int(a) for a in sys.argv[2:]])
@@ -0,0 +1,92 @@
+#!/usr/bin/python3
+
+import os
+import json
+import time
+from scenarios import index_from_scenario, scenario_from_index, merge_results, empty_result
+
+################################
+# CHECKPOINTS
+# the enumeration of the cyclic subgraphs is saved periodically in
+# <output>/<spec>.checkpoint.json as
+# {'spec':spec, 'subgraphs':{subgraph_id:{'pairs':str(pairs_array),
+#   'num_scenarios':N, 'next_index':i, 'result':{counters, 'insecure':[indexes]}}}}
+# i.e. the scenarios [0,next_index) of a subgraph have been checked and the sat
+# insecure ones are saved as their index (see scenario_from_index).
+# risk_structure and cyclic_risk_struct are rebuilt from the insecure scenarios.
+# The files where the scenarios are written (the .out and the scenario log) are
+# flushed when the checkpoint is saved and their sizes are in 'files'
+# ({filename:size}): a resumed run truncates them to those sizes, so that the
+# scenarios checked after the checkpoint are neither lost nor logged twice
+################################
+def checkpoint_filename(path, spec_package):
+    return os.path.join(path,spec_package+".checkpoint.json")
+
+def new_checkpoint(spec_package):
+    return {'spec':spec_package,'subgraphs':{}}
+
+def load_checkpoint(filename, spec_package):
+    if(not os.path.exists(filename)):
+        return new_checkpoint(spec_package)
+    with open(filename) as f:
+        checkpoint=json.load(f)
+    if(checkpoint.get('spec')!=spec_package):
+        print("ERROR checkpoint %s is not of spec %s, starting from scratch"%(filename,spec_package))
+        return new_checkpoint(spec_package)
+    return checkpoint
+
+#the checkpoint is written in a temporary file and then renamed,
+#so a run killed while saving leaves the previous checkpoint
+def save_checkpoint(filename, checkpoint):
+    tmp_filename=filename+".tmp"
+    with open(tmp_filename,"w") as f:
+        json.dump(checkpoint,f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename,filename)
+
+def truncate_to_checkpoint(checkpoint):
+    for filename,size in checkpoint.get('files',{}).items():
+        if(os.path.exists(filename) and os.path.getsize(filename)>size):
+            os.truncate(filename,size)
+
+def result_to_json(result):
+    saved={k:v for k,v in result.items() if k!='insecure'}
+    saved['insecure']=[index_from_scenario(t) for t in result['insecure']]
+    return saved
+
+def result_from_json(saved, num_pairs):
+    result=dict(saved)
+    result['insecure']=[scenario_from_index(i,num_pairs) for i in saved['insecure']]
+    return result
+
+#returns (next_index, result) of a subgraph saved in checkpoint,
+#(0, empty result) if it is not there or its pairs are different
+def resume_subgraph(checkpoint, subgraph_id, pairs_array, num_scenarios):
+    saved=checkpoint['subgraphs'].get(subgraph_id)
+    if(saved is None):
+        return 0,empty_result()
+    if(saved['pairs']!=str(pairs_array) or saved['num_scenarios']!=num_scenarios):
+        print("Subgraph %s changed since the checkpoint, starting from scratch"%subgraph_id)
+        return 0,empty_result()
+    return saved['next_index'],result_from_json(saved['result'],len(pairs_array))
+
+#returns a function (next_index, result) to pass to the engines as on_checkpoint
+#it saves the subgraph, with result merged to the result of the previous runs (done),
+#at most every interval seconds (and always when next_index==num_scenarios), after flushing files
+def subgraph_checkpointer(filename, checkpoint, subgraph_id, pairs_array, num_scenarios, done, interval=60, files=()):
+    state={'last':time.time()}
+    def on_checkpoint(next_index, result):
+        now=time.time()
+        if(now-state['last']<interval and next_index<num_scenarios):
+            return
+        merged=merge_results(merge_results(empty_result(),done),result)
+        checkpoint['subgraphs'][subgraph_id]={'pairs':str(pairs_array),'num_scenarios':num_scenarios,'next_index':next_index,'result':result_to_json(merged)}
+        checkpoint['files']={}
+        for f in files:
+            f.flush()
+            os.fsync(f.fileno())
+            checkpoint['files'][f.name]=os.fstat(f.fileno()).st_size
+        save_checkpoint(filename,checkpoint)
+        state['last']=now
+    return on_checkpoint
@@ -0,0 +1,230 @@
+#!/usr/bin/python3
+
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+import multiprocessing
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+import http.server
+import urllib.parse
+from parse_model import get_packages_from_xmi
+from rcc5_theory import declare_theory
+from progress import set_progress_mode
+from batch import analyze_package
+import secra
+
+################################
+# ANALYSIS DAEMON
+# a long running process that serves the analyses of the packages (json over
+# HTTP on localhost) without paying, at every request, the imports (z3, scipy,
+# xlsxwriter, pydot), the parsing of the xmi and the declaration of the theory:
+# - the packages of an xmi are parsed once (see get_packages_from_xmi) and
+#   parsed again only when the xmi changes (size or modification time)
+# - the analyses run in a pool of worker processes (at most workers at the same
+#   time), each declares the theory once and shares it among its analyses (see
+#   analyze in secra.py) with the solvers of the cyclic subgraphs, their subregions
+#   and rcc5 theory already asserted (see prepare_block_solver in secra.py); the
+#   outputs are written in the output directory as by batch.py, the analyses of
+#   the same package one at a time
+# - at most max_queue requests wait for a worker, the others are refused (503)
+# - the last result of each package is kept for the queries
+#
+#   POST /analyze {"package":name,"xmi":file,"options":{...}}  analyzes the package (the
+#                                     options are the variables of secra.py, see default_options)
+#   GET /results?package=name&xmi=file  the last result of the package
+#   GET /packages?xmi=file              the packages with agents of the xmi
+#   GET /status                         the workers, the requests and their latencies
+#
+# xmi is one of the xmi files given with --xmi at startup (the first one if omitted):
+# the daemon does not open other files of the local clients (403). The responses of the analyses have their
+# latency in seconds: 'queued' (parsing and waiting for a worker), 'analysis' and 'total'
+################################
+
+#the theory of a worker process, declared by its initializer, and the solvers of
+#the cyclic subgraphs it analyzed
+_worker={}
+
+def _init_worker():
+    set_progress_mode("silent")
+    _worker['theory']=declare_theory()
+    _worker['solvers']={}
+
+def _analyze(xmi_filename, spec_package, components_flows, path, options):
+    return analyze_package(xmi_filename, spec_package, components_flows, path, options, "silent", _worker['theory'], _worker['solvers'])
+
+def new_daemon(path, workers, max_queue, xmi_files):
+    return {'path':path,'workers':workers,'max_queue':max_queue,'xmi_files':[os.path.realpath(x) for x in xmi_files],'pool':None,'lock':threading.Lock(),'parse_lock':threading.Lock(),
+        'xmi':{},'results':{},'package_locks':{},'pending':0,'served':0,'failed':0,'refused':0,'latency_total':0.0,'latency_max':0.0}
+
+#forkserver: the workers are forked by a server process that has imported secra,
+#not by the (multithreaded) http server
+def start_pool(daemon):
+    context=multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(["secra"])
+    daemon['pool']=concurrent.futures.ProcessPoolExecutor(max_workers=daemon['workers'], mp_context=context, initializer=_init_worker)
+
+#returns (http status, error) if xmi_filename (the first xmi of the daemon if None)
+#is not one of the xmi of the daemon or does not exist, else (None, its real path)
+def check_xmi(daemon, xmi_filename):
+    key=daemon['xmi_files'][0] if xmi_filename is None else os.path.realpath(xmi_filename)
+    if(key not in daemon['xmi_files']):
+        return 403,{'error':"xmi %s not served (see --xmi)"%xmi_filename}
+    if(not os.path.exists(key)):
+        return 404,{'error':"xmi %s not found"%key}
+    return None,key
+
+#the parsed packages of xmi_filename, {'version','packages','parse_time'}
+def packages_of(daemon, xmi_filename):
+    key=os.path.realpath(xmi_filename)
+    stat=os.stat(key)
+    version=[stat.st_size,stat.st_mtime_ns]
+    with daemon['parse_lock']:
+        parsed=daemon['xmi'].get(key)
+        if(parsed is None or parsed['version']!=version):
+            start=time.time()
+            parsed={'version':version,'packages':get_packages_from_xmi(xmi=key)}
+            parsed['parse_time']=time.time()-start
+            print("Parsed %d packages of %s in %.3fs"%(len(parsed['packages']),xmi_filename,parsed['parse_time']))
+            daemon['xmi'][key]=parsed
+    return parsed
+
+#returns (http status, response) of an analysis request
+def analyze_request(daemon, request):
+    received=time.time()
+    spec_package=request.get('package')
+    options=request.get('options') or {}
+    unknown=[k for k in options if k not in secra.default_options()]
+    if(spec_package is None or unknown):
+        return 400,{'error':"no package" if spec_package is None else "unknown options %s"%", ".join(unknown)}
+    status,xmi_filename=check_xmi(daemon, request.get('xmi'))
+    if(status is not None):
+        return status,xmi_filename
+    with daemon['lock']:
+        if(daemon['pending']>=daemon['workers']+daemon['max_queue']):
+            daemon['refused']+=1
+            return 503,{'error':"%d requests pending, try again later"%daemon['pending']}
+        daemon['pending']+=1
+        #the analyses of a package write the same files
+        package_lock=daemon['package_locks'].setdefault(spec_package,threading.Lock())
+    try:
+        parsed=packages_of(daemon, xmi_filename)
+        if(spec_package not in parsed['packages']):
+            return 404,{'error':"package %s not found (or without agents) in %s"%(spec_package,xmi_filename)}
+        with package_lock:
+            pool=daemon['pool']
+            try:
+                row=pool.submit(_analyze, xmi_filename, spec_package, parsed['packages'][spec_package], daemon['path'], options).result()
+            except BrokenProcessPool:
+                #a worker died (e.g. killed): the pool is started again for the next requests
+                with daemon['lock']:
+                    if(daemon['pool'] is pool):
+                        start_pool(daemon)
+                        pool.shutdown(wait=False)
+                    daemon['failed']+=1
+                return 500,{'error':"worker process terminated during the analysis of %s"%spec_package}
+    finally:
+        with daemon['lock']:
+            daemon['pending']-=1
+    total=time.time()-received
+    response=dict(row)
+    response['xmi']=xmi_filename
+    response['latency']={'queued':total-row['seconds'],'analysis':row['seconds'],'total':total}
+    with daemon['lock']:
+        daemon['results'][(xmi_filename,spec_package)]=response
+        daemon['served']+=1
+        if(row['error'] is not None):
+            daemon['failed']+=1
+        daemon['latency_total']+=total
+        daemon['latency_max']=max(daemon['latency_max'],total)
+    return (200 if row['error'] is None else 500),response
+
+def results_request(daemon, query):
+    xmi_filename=daemon['xmi_files'][0] if query.get('xmi') is None else os.path.realpath(query['xmi'])
+    with daemon['lock']:
+        result=daemon['results'].get((xmi_filename,query.get('package')))
+    if(result is None):
+        return 404,{'error':"package %s of %s not analyzed"%(query.get('package'),xmi_filename)}
+    return 200,result
+
+def packages_request(daemon, query):
+    status,xmi_filename=check_xmi(daemon, query.get('xmi'))
+    if(status is not None):
+        return status,xmi_filename
+    parsed=packages_of(daemon, xmi_filename)
+    packages={name:{'agents':sum(1 for c in components_flows['components'].values() if c['type']=="agent")} for name,components_flows in parsed['packages'].items()}
+    return 200,{'xmi':xmi_filename,'parse_time':parsed['parse_time'],'packages':packages}
+
+def status_request(daemon, query):
+    with daemon['lock']:
+        return 200,{'workers':daemon['workers'],'max_queue':daemon['max_queue'],'pending':daemon['pending'],
+            'served':daemon['served'],'failed':daemon['failed'],'refused':daemon['refused'],
+            'latency':{'mean':daemon['latency_total']/daemon['served'] if daemon['served'] else None,'max':daemon['latency_max']},
+            'xmi':list(daemon['xmi']),'analyzed':sorted(package for xmi,package in daemon['results'])}
+
+GET_REQUESTS={'/results':results_request,'/packages':packages_request,'/status':status_request}
+
+def make_handler(daemon):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def reply(self, status, response, start):
+            data=json.dumps(response).encode()
+            self.send_response(status)
+            self.send_header("Content-Type","application/json")
+            self.send_header("Content-Length",str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            #one line per request with its latency
+            print("%s %s %d in %.3fs"%(self.command,self.path,status,time.time()-start),flush=True)
+
+        def do_GET(self):
+            start=time.time()
+            url=urllib.parse.urlparse(self.path)
+            if(url.path not in GET_REQUESTS):
+                return self.reply(404,{'error':"unknown request %s"%url.path},start)
+            query={k:v[-1] for k,v in urllib.parse.parse_qs(url.query).items()}
+            self.reply(*GET_REQUESTS[url.path](daemon, query),start)
+
+        def do_POST(self):
+            start=time.time()
+            if(self.path!="/analyze"):
+                return self.reply(404,{'error':"unknown request %s"%self.path},start)
+            try:
+                request=json.loads(self.rfile.read(int(self.headers.get("Content-Length",0))) or b"{}")
+            except ValueError as e:
+                return self.reply(400,{'error':"invalid json: %s"%e},start)
+            self.reply(*analyze_request(daemon, request),start)
+
+        #the requests are printed by reply
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Daemon serving the cybersecurity risk assessment of the packages of an xmi on localhost")
+    parser.add_argument("--port", type=int, default=8765, help="the port on 127.0.0.1 (default %(default)s)")
+    parser.add_argument("--output", default=os.path.join("./","output_secra"), help="the output directory (default %(default)s)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="analyses at the same time (default one per cpu)")
+    parser.add_argument("--max-queue", type=int, default=16, help="requests waiting for a worker, the others are refused (default %(default)s)")
+    parser.add_argument("--xmi", nargs="+", default=[secra.xmi_filename], help="the xmi files served, parsed at startup: the first one is the default of the requests (default %(default)s)")
+    args=parser.parse_args()
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+    daemon=new_daemon(args.output, args.workers, args.max_queue, args.xmi)
+    start_pool(daemon)
+    for xmi_filename in daemon['xmi_files']:
+        if(os.path.exists(xmi_filename)):
+            packages_of(daemon, xmi_filename)
+    #no authentication: only local clients
+    server=http.server.ThreadingHTTPServer(("127.0.0.1",args.port), make_handler(daemon))
+    print("Serving on http://127.0.0.1:%d with %d workers"%(args.port,args.workers),flush=True)
+    #stop on SIGTERM as on Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+    daemon['pool'].shutdown()
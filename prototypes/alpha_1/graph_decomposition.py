@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+
+################################
+# DECOMPOSITION OF THE GRAPH OF THE PAIRS
+# pairs is the adjacency list built by generate_graph (secra.py): each pair of
+# regions is stored once, either as X:[..., Y, ...] or as Y:[..., X, ...], thus
+# the subgraphs are the connected components of the undirected graph.
+# They are found with union-find on the ast ids of the Z3 constants (hashing
+# or comparing the constants builds Z3 terms) and a subgraph is cyclic iff its
+# cyclomatic number (edges - nodes + 1) is positive (a pair stored twice is a cycle).
+# The nodes of a subgraph are in depth first order from its first node in pairs
+# following the stored pairs (then from the next node in pairs not reached yet)
+################################
+def _find(parent, x):
+    root=x
+    while(parent[root]!=root):
+        root=parent[root]
+    while(parent[x]!=root):
+        parent[x],x=root,parent[x]
+    return root
+
+def _union(parent, size, x, y):
+    x=_find(parent, x)
+    y=_find(parent, y)
+    if(x==y):
+        return
+    if(size[x]<size[y]):
+        x,y=y,x
+    parent[y]=x
+    size[x]+=size[y]
+
+#returns {'cycle':[nodes, ...],'acycle':[nodes, ...],'summary':[{'nodes','edges','cyclomatic','cycle'}, ...]}
+#with the summary of the subgraphs in the order they are found
+def decompose(pairs):
+    nodes={}
+    parent={}
+    size={}
+    adjacency={}
+    keys=[]
+    for n,adj in pairs.items():
+        ids=[]
+        for m in [n]+list(adj):
+            i=m.get_id()
+            if(i not in nodes):
+                nodes[i]=m
+                parent[i]=i
+                size[i]=1
+            ids.append(i)
+        keys.append(ids[0])
+        adjacency.setdefault(ids[0],[]).extend(ids[1:])
+        for i in ids[1:]:
+            _union(parent, size, ids[0], i)
+
+    edges={}
+    for k in keys:
+        root=_find(parent, k)
+        edges[root]=edges.get(root,0)+len(adjacency[k])
+
+    subgraphs={'cycle':[],'acycle':[],'summary':[]}
+    component={}
+    visited=set()
+    for k in keys:
+        if(k in visited):
+            continue
+        root=_find(parent, k)
+        if(root not in component):
+            component[root]=[]
+            cyclomatic=edges[root]-size[root]+1
+            summary={'nodes':size[root],'edges':edges[root],'cyclomatic':cyclomatic,'cycle':cyclomatic>0}
+            subgraphs['summary'].append(summary)
+            subgraphs['cycle' if summary['cycle'] else 'acycle'].append(component[root])
+        stack=[k]
+        while(stack):
+            current=stack.pop()
+            if(current in visited):
+                continue
+            visited.add(current)
+            component[root].append(nodes[current])
+            stack.extend(adjacency.get(current,[]))
+    return subgraphs
+
+################################
+# BICONNECTED BLOCKS
+# the scenarios of two blocks of a subgraph joined by an articulation region
+# (or by a bridge, which is a block of one pair) do not constrain each other:
+# the sat scenarios of the subgraph are the combinations of the sat scenarios
+# of its blocks, thus each block is enumerated on its own (5^k1+5^k2 instead
+# of 5^(k1+k2) scenarios) and the counts are combined by product.
+# Blocks are found with (iterative) Hopcroft-Tarjan on the pairs, where a pair
+# stored twice is a block (a cycle of two pairs)
+################################
+#returns the blocks of the subgraph pairs as adjacency lists like pairs (with the
+#pairs in the order of pairs), in the order of their first pair in pairs
+def biconnected_blocks(pairs):
+    nodes={}
+    edges=[]
+    for n,adj in pairs.items():
+        for m in adj:
+            nodes[n.get_id()]=n
+            nodes[m.get_id()]=m
+            edges.append((n.get_id(),m.get_id()))
+    incident={i:[] for i in nodes}
+    for e,(u,v) in enumerate(edges):
+        incident[u].append((v,e))
+        incident[v].append((u,e))
+
+    discovery={}
+    low={}
+    edge_stack=[]
+    blocks=[]
+    for start in nodes:
+        if(start in discovery):
+            continue
+        discovery[start]=low[start]=len(discovery)
+        #(node, edge used to reach it, position in its incident edges)
+        stack=[[start,None,0]]
+        while(stack):
+            frame=stack[-1]
+            u,parent_edge,i=frame
+            if(i<len(incident[u])):
+                frame[2]+=1
+                v,e=incident[u][i]
+                if(e==parent_edge):
+                    continue
+                if(v not in discovery):
+                    edge_stack.append(e)
+                    discovery[v]=low[v]=len(discovery)
+                    stack.append([v,e,0])
+                elif(discovery[v]<discovery[u]):
+                    edge_stack.append(e)
+                    low[u]=min(low[u],discovery[v])
+            else:
+                stack.pop()
+                if(stack):
+                    p=stack[-1][0]
+                    low[p]=min(low[p],low[u])
+                    if(low[u]>=discovery[p]):
+                        block=[]
+                        while(True):
+                            e=edge_stack.pop()
+                            block.append(e)
+                            if(e==parent_edge):
+                                break
+                        blocks.append(sorted(block))
+    blocks.sort()
+
+    result=[]
+    for block in blocks:
+        block_pairs={}
+        for e in block:
+            u,v=edges[e]
+            block_pairs.setdefault(nodes[u],[]).append(nodes[v])
+        result.append(block_pairs)
+    return result
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import os
+import json
+from rcc5_algebra import INVERSE
+from scenarios import index_from_scenario, scenario_from_index, empty_result
+from subgraph_cache import CACHE_VERSION, to_canonical, from_canonical
+
+################################
+# RUN MANIFEST
+# the cyclic subgraphs (and blocks) analyzed by the last run of a spec are
+# recorded in <output>/<spec>.manifest.json as
+# {'spec':spec, 'version':CACHE_VERSION, 'subgraphs':{subgraph_id:{'pairs':str(pairs_array),
+#   'key':canonical key, 'order':canonical order (see canonical_form), 'mode':"enumeration"/"counting",
+#   'result':{counters, 'insecure':[indexes] (enumeration) or 'relation_counts' (counting)}}}}
+# with the results in the order of pairs_array. The next run diffs its subgraphs
+# against it: a subgraph with the same pairs is unchanged and its result is reused
+# as it is, a subgraph with the same canonical form of one of the manifest (e.g.
+# a renamed region, or a block of a subgraph that changed elsewhere) is reused
+# through the canonical order of the two, the others are analyzed again
+################################
+def manifest_filename(path, spec_package):
+    return os.path.join(path,spec_package+".manifest.json")
+
+def new_manifest(spec_package):
+    return {'spec':spec_package,'version':CACHE_VERSION,'subgraphs':{}}
+
+def load_manifest(filename, spec_package):
+    if(not os.path.exists(filename)):
+        return new_manifest(spec_package)
+    with open(filename) as f:
+        manifest=json.load(f)
+    if(manifest.get('spec')!=spec_package or manifest.get('version')!=CACHE_VERSION):
+        print("Manifest %s is not of spec %s (or of this theory), analyzing every subgraph"%(filename,spec_package))
+        return new_manifest(spec_package)
+    return manifest
+
+def save_manifest(filename, manifest):
+    tmp_filename=filename+".tmp"
+    with open(tmp_filename,"w") as f:
+        json.dump(manifest,f)
+    os.replace(tmp_filename,filename)
+
+#results with unknown scenarios are not recorded (they are analyzed again)
+def record_subgraph(manifest, subgraph_id, pairs_array, form, mode, result):
+    if(result['counter_unknown']!=0):
+        return
+    saved={k:result[k] for k in ('counter_sat','counter_unsat','counter_unknown')}
+    if(mode=="counting"):
+        saved['relation_counts']=result['relation_counts']
+    else:
+        saved['insecure']=[index_from_scenario(t) for t in result['insecure']]
+    manifest['subgraphs'][subgraph_id]={'pairs':str(pairs_array),'key':form['key'],'order':form['order'],'mode':mode,'result':saved}
+
+#the relation codes of a scenario (or the counts of the relations of the pairs) of
+#a subgraph of the manifest, in the order of the pairs of an isomorphic subgraph
+def _translate_scenario(t, entry, form):
+    return from_canonical(to_canonical(t,entry['order']),form['order'])
+
+def _translate_relation_counts(relation_counts, entry, form):
+    translated=[None]*len(relation_counts)
+    for (i,swapped),(k,form_swapped) in zip(entry['order'],form['order']):
+        if(swapped==form_swapped):
+            translated[k]=list(relation_counts[i])
+        else:
+            translated[k]=[relation_counts[i][INVERSE[r]] for r in range(len(relation_counts[i]))]
+    return translated
+
+#returns ("unchanged", result) if the subgraph is in the manifest with the same pairs,
+#("isomorphic", result) if a subgraph of the manifest has its canonical form and
+#(None, None) if it has to be analyzed. The result is as if the scenarios had been
+#checked (without checks, see empty_result)
+def reuse_subgraph(manifest, subgraph_id, pairs_array, form, mode):
+    entry=manifest['subgraphs'].get(subgraph_id)
+    if(entry is not None and entry['mode']==mode and entry['pairs']==str(pairs_array)):
+        reuse="unchanged"
+    else:
+        entry=next((e for e in manifest['subgraphs'].values() if e['key']==form['key'] and e['mode']==mode),None)
+        reuse="isomorphic"
+    if(entry is None):
+        return None,None
+    saved=entry['result']
+    result=empty_result()
+    for k in ('counter_sat','counter_unsat','counter_unknown'):
+        result[k]=saved[k]
+    num_pairs=len(pairs_array)
+    if(mode=="counting"):
+        result['relation_counts']=saved['relation_counts'] if reuse=="unchanged" else _translate_relation_counts(saved['relation_counts'],entry,form)
+    elif(reuse=="unchanged"):
+        result['insecure']=[scenario_from_index(i,num_pairs) for i in saved['insecure']]
+    else:
+        #in enumeration order, as if the scenarios of this subgraph had been checked
+        result['insecure']=sorted(_translate_scenario(scenario_from_index(i,num_pairs),entry,form) for i in saved['insecure'])
+    return reuse,result
@@ -0,0 +1,41 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+
+#change it when the parser or the assignment of the regions changes
+#so that the models cached by previous versions are not used
+MODEL_CACHE_VERSION="abf-regions-1"
+
+################################
+# PARSED MODEL CACHE
+# one json file per model in cache_dir, content addressed by the hash of the
+# bytes of the xmi and of the name of the spec package: a changed xmi (or
+# another package) has another key, thus the cached model is never stale.
+# The model is stored as plain data (names of the regions instead of Z3
+# constants, lists instead of sets), see model_to_data in secra.py
+################################
+def model_cache_key(xmi_filename, spec_package):
+    digest=hashlib.sha256()
+    digest.update(("%s;%s;"%(MODEL_CACHE_VERSION,spec_package)).encode())
+    with open(xmi_filename,"rb") as f:
+        for chunk in iter(lambda:f.read(1<<20),b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def lookup_model(cache_dir, key):
+    filename=os.path.join(cache_dir,key+".json")
+    if(not os.path.exists(filename)):
+        return None
+    with open(filename) as f:
+        return json.load(f)
+
+def store_model(cache_dir, key, data):
+    #a tmp file per process, since the workers of batch.py share the cache
+    os.makedirs(cache_dir,exist_ok=True)
+    filename=os.path.join(cache_dir,key+".json")
+    tmp_filename="%s.%d.tmp"%(filename,os.getpid())
+    with open(tmp_filename,"w") as f:
+        json.dump(data,f,separators=(',',':'))
+    os.replace(tmp_filename,filename)
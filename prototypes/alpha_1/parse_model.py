@@ -4,8 +4,84 @@
 import sys
 import os
 import re 
+import time
+import tracemalloc
 import xml.etree.ElementTree as ET
 
+################################
+# STREAMING XMI
+# the xmi is read with iterparse in one pass and each element is cleared when
+# it ends, so the memory does not grow with the size of the export: only the
+# attributes of the elements we need are kept
+# - the ids of the ABF-theory types (the elements of the abf_theory_package
+#   package and the InputPort, OutputPort and FunctionalBlock classes)
+# - the agents (uml:Node) of the cps_spec_name package with their ports and
+#   properties, and its information flows, in document order
+# the types are resolved after the pass since the package of the spec may
+# come before the ABF-theory in the xmi.
+# scan_xmi_packages keeps the elements of more packages (all of them with
+# cps_spec_names=None) in the same pass (see get_packages_from_xmi)
+################################
+ABF_TYPES={'Fact','Belief','Assertion','Base'}
+ABF_CLASSES={'InputPort','OutputPort','FunctionalBlock'}
+
+def scan_xmi(cps_spec_name,abf_theory_package="ABFTheory",schema="{http://schema.omg.org/spec/XMI/2.1}",xmi="Engineering.xmi"):
+    scanned=scan_xmi_packages([cps_spec_name],abf_theory_package,schema,xmi)
+    return {'ID':scanned['ID'],'elements':scanned['packages'].get(cps_spec_name,[])}
+
+#returns {'ID':ID,'packages':{name:elements}} with the elements of the packages named in
+#cps_spec_names, or of every top level uml:Package but the ABF-theory if it is None
+def scan_xmi_packages(cps_spec_names=None,abf_theory_package="ABFTheory",schema="{http://schema.omg.org/spec/XMI/2.1}",xmi="Engineering.xmi"):
+    ID={}
+    packages={}
+    depth=0
+    #the top level packagedElement we are in: the ABF-theory, a spec (its elements) or None
+    abf=False
+    elements=None
+    node=None
+    root=None
+    for event,elem in ET.iterparse(xmi,events=("start","end")):
+        if(event=="start"):
+            depth+=1
+            if(depth==1):
+                root=elem
+            elif(depth==2 and elem.tag=="packagedElement"):
+                if(elem.get(schema+'type')=="uml:Package" and elem.get('name')==abf_theory_package):
+                    abf=True
+                elif((cps_spec_names is None and elem.get(schema+'type')=="uml:Package") or (cps_spec_names is not None and elem.get('name') in cps_spec_names)):
+                    elements=packages.setdefault(elem.get('name'),[])
+                if(elem.get(schema+'type')=="uml:Class" and elem.get('name') in ABF_CLASSES):
+                    ID[elem.get(schema+'id')]=elem.get('name')
+            elif(depth==3 and abf):
+                if(elem.get('name') in ABF_TYPES):
+                    ID[elem.get(schema+'id')]=elem.get('name')
+            elif(depth==3 and elements is not None):
+                if(elem.get(schema+'type')=="uml:Node"):
+                    node=elem.get(schema+'id')
+                    elements.append(('agent',dict(elem.attrib)))
+                elif(elem.get(schema+'type')=="uml:InformationFlow"):
+                    elements.append(('flow',dict(elem.attrib)))
+            elif(depth==4 and node is not None):
+                elements.append(('attribute',node,dict(elem.attrib)))
+        else:
+            if(depth==2):
+                abf=False
+                elements=None
+                root.clear()
+            elif(depth==3):
+                node=None
+            elem.clear()
+            depth-=1
+    return {'ID':ID,'packages':packages}
+
+#{name:[id, ...]} of the sockets, in the order of components
+def index_sockets(components):
+    sockets={}
+    for k,v in components.items():
+        if(v['type']=="inputsocket" or v['type']=="outputsocket"):
+            sockets.setdefault(v['name'],[]).append(k)
+    return sockets
+
 #given as inputs:
 # - xmi: v-research xmi containing the whole Engineering of:
 # -- the ABF-theory (of which the package name needs to be specified in abf_theory_package)
@@ -14,130 +90,132 @@ import xml.etree.ElementTree as ET
 #returns as output a structure of components as a dictionary with two entries:
 # 1. components: {ID:{'name': 'sensor', 'owner': 'root', 'type': 'agent'}}
 # 2. flows: {ID: [ID1, ID2, ...]}
-def get_components_from_xmi(cps_spec_name,abf_theory_package="ABFTheory",schema="{http://schema.omg.org/spec/XMI/2.1}",xmi="Engineering.xmi"):
+#and the time (in seconds) to parse the xmi in stats (with the peak of the memory
+#allocated while parsing, in bytes, if trace_memory, else None)
+def get_components_from_xmi(cps_spec_name,abf_theory_package="ABFTheory",schema="{http://schema.omg.org/spec/XMI/2.1}",xmi="Engineering.xmi",trace_memory=False):
+    if(trace_memory):
+        tracemalloc.start()
+    start=time.time()
+    scanned=scan_xmi(cps_spec_name,abf_theory_package,schema,xmi)
+    parse_time=time.time()-start
+    peak_memory=None
+    if(trace_memory):
+        peak_memory=tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    components_flows=components_from_elements(scanned['ID'],scanned['elements'],schema)
+    components_flows['stats']={'parse_time':parse_time,'peak_memory':peak_memory}
+    return components_flows
+
+#the components and flows (see get_components_from_xmi) of the elements of a package
+#scanned by scan_xmi, where ID has the ids of the ABF-theory types
+def components_from_elements(ID,elements,schema="{http://schema.omg.org/spec/XMI/2.1}"):
     components_flows={}
-    tree = ET.parse(xmi)
-    root = tree.getroot()
     #{id:{name,type}} for agents, ports, and functional blocks
     components={}
     #adjacency list
     #{id1:[id2]} for information flows (id1->id2)
     #{id1:[id2, id3]} for information flows (id1->id2 and id1->id3)
     flows={}
-    ID={}
-    for child in root:
-        if(child.tag == "packagedElement"):
-            if(child.attrib[schema+'type'] == "uml:Package" and child.attrib['name'] == abf_theory_package):
-                for elem in child:
-                    if(elem.attrib['name'] == "Fact"):
-                        ID[elem.attrib[schema+'id']]='Fact'
-                    elif(elem.attrib['name'] == "Belief"):
-                        ID[elem.attrib[schema+'id']]='Belief'
-                    elif(elem.attrib['name'] == "Assertion"):
-                        ID[elem.attrib[schema+'id']]='Assertion'
-                    elif(elem.attrib['name'] == "Base"):
-                        ID[elem.attrib[schema+'id']]='Base'
-            elif(child.attrib[schema+'type'] == "uml:Class"):
-                if(child.attrib['name'] == "InputPort"):
-                    ID[child.attrib[schema+'id']]='InputPort'
-                elif(child.attrib['name'] == "OutputPort"):
-                    ID[child.attrib[schema+'id']]='OutputPort'
-                elif(child.attrib['name'] == "FunctionalBlock"):
-                    ID[child.attrib[schema+'id']]='FunctionalBlock'
-    
-            #this is just a speedup but we need to increase this is we add support for other attributes 
-            if(len(ID)==4):
-                break
-    
-    for child in root:
-            if(child.tag == "packagedElement" and child.attrib['name'] == cps_spec_name):
-                for innerchild in child:
-                    #print(innerchild.tag, innerchild.attrib)
-                    #find agents as Nodes in deployment diagram
-                    if(innerchild.attrib[schema+'type'] == "uml:Node"):
-                        #print(innerchild.tag, innerchild.attrib)
-                        components[innerchild.attrib[schema+'id']]={'name':innerchild.attrib['name']}
-                        components[innerchild.attrib[schema+'id']]['type']='agent'
-                        components[innerchild.attrib[schema+'id']]['owner']='root'
-                        for attribute in innerchild:
-                            #print(attribute.tag, attribute.attrib)
-                            #print(attribute.attrib[schema+'type']) 
-                            if(attribute.attrib[schema+'type'] == "uml:Port"):
-                                components[attribute.attrib[schema+'id']]={'name':attribute.attrib['name']}
-                                if(ID[attribute.attrib['type']]=="InputPort"):
-                                    components[attribute.attrib[schema+'id']]['type']='inputport'
-                                elif(ID[attribute.attrib['type']]=="OutputPort"):
-                                    components[attribute.attrib[schema+'id']]['type']='outputport'
-                                components[attribute.attrib[schema+'id']]['owner']=innerchild.attrib[schema+'id']
-                            elif(attribute.attrib[schema+'type'] == "uml:Property"):
-                                components[attribute.attrib[schema+'id']]={'name':attribute.attrib['name']}
-                                components[attribute.attrib[schema+'id']]['owner']=innerchild.attrib[schema+'id']
-                                if(ID[attribute.attrib['type']]=="InputPort"):
-                                    components[attribute.attrib[schema+'id']]['type']='inputsocket'
-                                elif(ID[attribute.attrib['type']]=="OutputPort"):
-                                    components[attribute.attrib[schema+'id']]['type']='outputsocket'
-                                elif(ID[attribute.attrib['type']]=="FunctionalBlock"):
-                                    components[attribute.attrib[schema+'id']]['type']='funblock'
-                                elif(ID[attribute.attrib['type']]=="Base"):
-                                    components[attribute.attrib[schema+'id']]['type']='base'
-                                elif(ID[attribute.attrib['type']]=="Fact"):
-                                    components[attribute.attrib[schema+'id']]['type']='fact'
-                                elif(ID[attribute.attrib['type']]=="Belief"):
-                                    components[attribute.attrib[schema+'id']]['type']='belief'
-                                elif(ID[attribute.attrib['type']]=="Assertion"):
-                                    components[attribute.attrib[schema+'id']]['type']='assertion'
-                                else:
-                                    print("DEBUG Attribute not supported")
-                                    print("DEBUG name: ",attribute.attrib['name'])
-                                    print("DEBUG id: ",attribute.attrib[schema+'id'])
-                    elif(innerchild.attrib[schema+'type'] == "uml:InformationFlow"):
-                        if(innerchild.attrib['informationSource'] in flows):
-                            flows[innerchild.attrib['informationSource']].append(innerchild.attrib['informationTarget'])
-                        else:
-                            flows[innerchild.attrib['informationSource']]=[innerchild.attrib['informationTarget']]
+
+    for element in elements:
+        #find agents as Nodes in deployment diagram
+        if(element[0]=="agent"):
+            innerchild=element[1]
+            components[innerchild[schema+'id']]={'name':innerchild['name']}
+            components[innerchild[schema+'id']]['type']='agent'
+            components[innerchild[schema+'id']]['owner']='root'
+        elif(element[0]=="attribute"):
+            owner=element[1]
+            attribute=element[2]
+            if(attribute[schema+'type'] == "uml:Port"):
+                components[attribute[schema+'id']]={'name':attribute['name']}
+                if(ID[attribute['type']]=="InputPort"):
+                    components[attribute[schema+'id']]['type']='inputport'
+                elif(ID[attribute['type']]=="OutputPort"):
+                    components[attribute[schema+'id']]['type']='outputport'
+                components[attribute[schema+'id']]['owner']=owner
+            elif(attribute[schema+'type'] == "uml:Property"):
+                components[attribute[schema+'id']]={'name':attribute['name']}
+                components[attribute[schema+'id']]['owner']=owner
+                if(ID[attribute['type']]=="InputPort"):
+                    components[attribute[schema+'id']]['type']='inputsocket'
+                elif(ID[attribute['type']]=="OutputPort"):
+                    components[attribute[schema+'id']]['type']='outputsocket'
+                elif(ID[attribute['type']]=="FunctionalBlock"):
+                    components[attribute[schema+'id']]['type']='funblock'
+                elif(ID[attribute['type']]=="Base"):
+                    components[attribute[schema+'id']]['type']='base'
+                elif(ID[attribute['type']]=="Fact"):
+                    components[attribute[schema+'id']]['type']='fact'
+                elif(ID[attribute['type']]=="Belief"):
+                    components[attribute[schema+'id']]['type']='belief'
+                elif(ID[attribute['type']]=="Assertion"):
+                    components[attribute[schema+'id']]['type']='assertion'
+                else:
+                    print("DEBUG Attribute not supported")
+                    print("DEBUG name: ",attribute['name'])
+                    print("DEBUG id: ",attribute[schema+'id'])
+        elif(element[0]=="flow"):
+            innerchild=element[1]
+            if(innerchild['informationSource'] in flows):
+                flows[innerchild['informationSource']].append(innerchild['informationTarget'])
+            else:
+                flows[innerchild['informationSource']]=[innerchild['informationTarget']]
     
     #we create a channel per each flow between ports, and we update the flow f1->f2 to f1->channel channel->f2
-    flow2del={}
-    #flow2add={}
+    #(only the flow to the last input port of an output port is rewritten)
+    channel_flows=[]
     for f1k,f1v in flows.items():
         if(components[f1k]['type']=="outputport"):
-            for target in f1v:
-                if(components[target]['type']=="inputport"):
-                    components[f1k+target]={'name':components[f1k]['name']+"2"+components[target]['name'],'owner':"root",'type':"channel"}#,'source':f1k,'target':target}
-                    flow2del[f1k]=target
-                    #flow2add[f1k]=f1k+target
-                    #flow2add[f1k+target]=target
-
-    for f2dk,f2dv in flow2del.items():
-        flows[f2dk].remove(f2dv)
-        flows[f2dk].append(f2dk+f2dv)
-        flows[f2dk+f2dv]=[f2dv]
+            targets=[target for target in f1v if components[target]['type']=="inputport"]
+            for target in targets:
+                components[f1k+target]={'name':components[f1k]['name']+"2"+components[target]['name'],'owner':"root",'type':"channel"}
+            if(targets):
+                f1v.remove(targets[-1])
+                f1v.append(f1k+targets[-1])
+                channel_flows.append((f1k+targets[-1],targets[-1]))
+    for channel,target in channel_flows:
+        flows[channel]=[target]
     
     #we create a "fake flow" from port-socket 
     #for each port there must be a socket, the opposite may not be true
     #we could also merge based on name
+    sockets=index_sockets(components)
     for c1k,c1v in components.items():
         if(c1v['type']=="inputport" or c1v['type']=="outputport"):
-            for c2k,c2v in components.items():
-                if(c2v['type']=="inputsocket" or c2v['type']=="outputsocket"):
-                    if(c1v['name'] == c2v['name']):
-                        if(c1v['type']=="inputport"):
-                            #port -> socket
-                            if(c1k in flows):
-                                flows[c1k].append(c2k)
-                            else:
-                                flows[c1k]=[c2k]
-                        elif(c1v['type']=="outputport"):
-                            #socket -> port
-                            if(c2k in flows):
-                                flows[c2k].append(c1k)
-                            else:
-                                flows[c2k]=[c1k]
+            for c2k in sockets.get(c1v['name'],[]):
+                if(c1v['type']=="inputport"):
+                    #port -> socket
+                    if(c1k in flows):
+                        flows[c1k].append(c2k)
+                    else:
+                        flows[c1k]=[c2k]
+                elif(c1v['type']=="outputport"):
+                    #socket -> port
+                    if(c2k in flows):
+                        flows[c2k].append(c1k)
+                    else:
+                        flows[c2k]=[c1k]
 
     components_flows['components']=components
     components_flows['flows']=flows
     return components_flows
 
+#the components and flows of every package of the xmi with at least an agent, parsed
+#in one pass: {name:{'components','flows','stats'}} in the order of the packages,
+#where stats has the time to parse the whole xmi
+def get_packages_from_xmi(abf_theory_package="ABFTheory",schema="{http://schema.omg.org/spec/XMI/2.1}",xmi="Engineering.xmi"):
+    start=time.time()
+    scanned=scan_xmi_packages(None,abf_theory_package,schema,xmi)
+    parse_time=time.time()-start
+    packages={}
+    for name,elements in scanned['packages'].items():
+        if(not any(element[0]=="agent" for element in elements)):
+            continue
+        packages[name]=components_from_elements(scanned['ID'],elements,schema)
+        packages[name]['stats']={'parse_time':parse_time,'peak_memory':None}
+    return packages
+
 def create_model_dot(path, cps_spec_name, components, flows):
     f=open(os.path.join(path,cps_spec_name+"_model.dot"),"w+")
     f.write("digraph %s {"%re.sub('[^A-Za-z0-9]+', '', cps_spec_name))
@@ -177,9 +255,10 @@ def test_this_file():
     if not os.path.exists(path):
         os.mkdir(path)
     spec="TwoGuysTalking"
-    components_flows=get_components_from_xmi(cps_spec_name=spec)
+    components_flows=get_components_from_xmi(cps_spec_name=spec,trace_memory=True)
     components=components_flows['components']
     flows=components_flows['flows']
+    print("parse time %.3fs, peak memory %.1fMB"%(components_flows['stats']['parse_time'],components_flows['stats']['peak_memory']/(1<<20)))
     
     import pprint
     pp=pprint.PrettyPrinter(indent=0)
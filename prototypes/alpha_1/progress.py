@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+
+import sys
+import json
+import time
+
+# Print iterations progress
+# taken from (thanks Greenstick):
+# https://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
+def printProgressBar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 100, fill = '█', printEnd = "\r"):
+    """
+    Call in a loop to create terminal progress bar
+    @params:
+        iteration   - Required  : current iteration (Int)
+        total       - Required  : total iterations (Int)
+        prefix      - Optional  : prefix string (Str)
+        suffix      - Optional  : suffix string (Str)
+        decimals    - Optional  : positive number of decimals in percent complete (Int)
+        length      - Optional  : character length of bar (Int)
+        fill        - Optional  : bar fill character (Str)
+        printEnd    - Optional  : end character (e.g. "\r", "\r\n") (Str)
+    """
+    percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
+    filledLength = int(length * iteration // total)
+    bar = fill * filledLength + '-' * (length - filledLength)
+    print('\r%s |%s| %s%% %s' % (prefix, bar, percent, suffix), end = printEnd)
+    # Print New Line on Complete
+    if iteration == total:
+        print()
+
+################################
+# PROGRESS AND TELEMETRY
+# a phase (e.g. the scenarios of a subgraph) is a dict updated in the hot
+# loops with update_phase, that renders it at most every interval seconds:
+# - "bar": progress bar with throughput (items/s) and ETA
+# - "silent": nothing
+# - "json": one json object per line on stderr (stdout has the other messages)
+# end_phase records the time of the phase (see phase_timings)
+################################
+PROGRESS_MODES=("bar","silent","json")
+_settings={'mode':"bar",'interval':0.5}
+_timings=[]
+
+def set_progress_mode(mode, interval=0.5):
+    if(mode not in PROGRESS_MODES):
+        raise ValueError("progress mode %s not in %s"%(mode,str(PROGRESS_MODES)))
+    _settings['mode']=mode
+    _settings['interval']=interval
+
+#total can be None if it is not known (only the number of items done is shown)
+#enabled=False disables the rendering of the phase (e.g. in worker processes)
+def start_phase(name, total, enabled=True):
+    return {'phase':name,'total':total,'done':0,'counters':{},'start':time.time(),'last':0.0,'enabled':enabled and _settings['mode']!="silent"}
+
+def update_phase(phase, done, **counters):
+    phase['done']=done
+    phase['counters'].update(counters)
+    if(not phase['enabled']):
+        return
+    now=time.time()
+    #the last update is rendered by end_phase
+    if(now-phase['last']<_settings['interval'] or done==phase['total']):
+        return
+    phase['last']=now
+    _render_phase(phase, now, "progress")
+
+def end_phase(phase, **counters):
+    phase['counters'].update(counters)
+    now=time.time()
+    elapsed=now-phase['start']
+    timing={'phase':phase['phase'],'done':phase['done'],'total':phase['total'],'seconds':elapsed,'rate':_rate(phase,now)}
+    _timings.append(timing)
+    if(phase['enabled']):
+        _render_phase(phase, now, "end")
+        #printProgressBar ends the line of a completed bar
+        if(_settings['mode']=="bar" and phase['done']!=phase['total']):
+            print()
+    return timing
+
+#the phases ended so far: [{'phase','done','total','seconds','rate'},...]
+def phase_timings():
+    return list(_timings)
+
+#forgets the phases ended after the first ones (e.g. at the end of an analysis,
+#in long running processes)
+def clear_timings(first=0):
+    del _timings[first:]
+
+def _rate(phase, now):
+    elapsed=now-phase['start']
+    return phase['done']/elapsed if elapsed>0 else 0.0
+
+def _render_phase(phase, now, event):
+    rate=_rate(phase, now)
+    eta=None
+    if(phase['total'] is not None and rate>0):
+        eta=(phase['total']-phase['done'])/rate
+    if(_settings['mode']=="json"):
+        record={'event':event,'phase':phase['phase'],'done':phase['done'],'total':phase['total'],'elapsed':round(now-phase['start'],3),'rate':round(rate,3),'eta':None if eta is None else round(eta,3)}
+        record.update(phase['counters'])
+        print(json.dumps(record), file=sys.stderr, flush=True)
+        return
+    suffix="%.1f/s"%rate
+    if(eta is not None):
+        suffix+=" eta:%ds"%eta
+    for k,v in phase['counters'].items():
+        suffix+=" %s:%s"%(k,v)
+    if(phase['total']):
+        printProgressBar(min(phase['done'],phase['total']),phase['total'],prefix=phase['phase'],suffix=suffix,decimals=2,length=50,printEnd="")
+    else:
+        print("\r%s %d %s"%(phase['phase'],phase['done'],suffix), end="")
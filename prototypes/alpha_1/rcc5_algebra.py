@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+from rcc5_theory import RCC5_RELATIONS
+
+################################
+# RCC5 relation algebra (no Z3): relations are bitmasks over the
+# relation codes of RCC5_RELATIONS (EQ=0, PP=1, PPi=2, PO=3, DR=4)
+################################
+EQ_CODE=RCC5_RELATIONS.index('EQ')
+PP_CODE=RCC5_RELATIONS.index('PP')
+PPI_CODE=RCC5_RELATIONS.index('PPi')
+PO_CODE=RCC5_RELATIONS.index('PO')
+DR_CODE=RCC5_RELATIONS.index('DR')
+
+UNIVERSAL=(1<<len(RCC5_RELATIONS))-1
+
+def relation_mask(*codes):
+    mask=0
+    for c in codes:
+        mask|=1<<c
+    return mask
+
+#R(X,Y) <-> inverse(R)(Y,X)
+INVERSE=[EQ_CODE,PPI_CODE,PP_CODE,PO_CODE,DR_CODE]
+
+################################
+# composition table R1(X,Y) /\ R2(Y,Z) -> R(X,Z)
+# it is the table returned by rcc_five_sat_table in
+# ../alpha_0/rcc5_finiteDomain_mereology.py (54 consistent triangles)
+# (see Section 5.2 in "Santaca et al., A Topological Categorization of Agents for the
+#   Definition of Attack States in Multi-Agent Systems")
+################################
+COMPOSITION={
+    (DR_CODE,DR_CODE):UNIVERSAL,
+    (DR_CODE,PO_CODE):relation_mask(DR_CODE,PO_CODE,PP_CODE),
+    (DR_CODE,EQ_CODE):relation_mask(DR_CODE),
+    (DR_CODE,PP_CODE):relation_mask(DR_CODE,PO_CODE,PP_CODE),
+    (DR_CODE,PPI_CODE):relation_mask(DR_CODE),
+
+    (PO_CODE,DR_CODE):relation_mask(DR_CODE,PO_CODE,PPI_CODE),
+    (PO_CODE,PO_CODE):UNIVERSAL,
+    (PO_CODE,EQ_CODE):relation_mask(PO_CODE),
+    (PO_CODE,PP_CODE):relation_mask(PO_CODE,PP_CODE),
+    (PO_CODE,PPI_CODE):relation_mask(DR_CODE,PO_CODE,PPI_CODE),
+
+    (EQ_CODE,DR_CODE):relation_mask(DR_CODE),
+    (EQ_CODE,PO_CODE):relation_mask(PO_CODE),
+    (EQ_CODE,EQ_CODE):relation_mask(EQ_CODE),
+    (EQ_CODE,PP_CODE):relation_mask(PP_CODE),
+    (EQ_CODE,PPI_CODE):relation_mask(PPI_CODE),
+
+    (PPI_CODE,DR_CODE):relation_mask(DR_CODE,PO_CODE,PPI_CODE),
+    (PPI_CODE,PO_CODE):relation_mask(PO_CODE,PPI_CODE),
+    (PPI_CODE,EQ_CODE):relation_mask(PPI_CODE),
+    (PPI_CODE,PP_CODE):relation_mask(PO_CODE,EQ_CODE,PP_CODE,PPI_CODE),
+    (PPI_CODE,PPI_CODE):relation_mask(PPI_CODE),
+
+    (PP_CODE,DR_CODE):relation_mask(DR_CODE),
+    (PP_CODE,PO_CODE):relation_mask(DR_CODE,PO_CODE,PP_CODE),
+    (PP_CODE,EQ_CODE):relation_mask(PP_CODE),
+    (PP_CODE,PP_CODE):relation_mask(PP_CODE),
+    (PP_CODE,PPI_CODE):UNIVERSAL,
+}
+
+def _compose_masks(m1, m2):
+    mask=0
+    for r1 in range(len(RCC5_RELATIONS)):
+        if(m1 & (1<<r1)):
+            for r2 in range(len(RCC5_RELATIONS)):
+                if(m2 & (1<<r2)):
+                    mask|=COMPOSITION[(r1,r2)]
+    return mask
+
+def _inverse_mask(m):
+    mask=0
+    for r in range(len(RCC5_RELATIONS)):
+        if(m & (1<<r)):
+            mask|=1<<INVERSE[r]
+    return mask
+
+#composition and inverse of every (disjunctive) relation, so that
+#closure only does table lookups
+COMPOSE_MASK=[[_compose_masks(m1,m2) for m2 in range(UNIVERSAL+1)] for m1 in range(UNIVERSAL+1)]
+INVERSE_MASK=[_inverse_mask(m) for m in range(UNIVERSAL+1)]
+
+#the constraint network of a subgraph: its regions (nodes) and,
+#per each pair in pairs_array, the indexes of the two regions
+def constraint_network(pairs_array):
+    nodes={}
+    edges=[]
+    for p1,p2 in pairs_array:
+        for p in (p1,p2):
+            if(str(p) not in nodes):
+                nodes[str(p)]=len(nodes)
+        edges.append((nodes[str(p1)],nodes[str(p2)]))
+    return {'num_nodes':len(nodes),'edges':edges}
+
+################################
+# ALGEBRAIC CLOSURE (path consistency)
+# refines R(i,k) with R(i,j);R(j,k) for all the triangles of the network
+# until a fixpoint. A scenario (one relation per pair, universal relation
+# between the regions that are not paired) is inconsistent if a relation
+# becomes empty. For networks of RCC5 base relations the closure also
+# decides consistency, i.e. a closed network is satisfiable
+################################
+def path_consistent(network, scenario):
+    n=network['num_nodes']
+    matrix=[[UNIVERSAL]*n for i in range(n)]
+    for i in range(n):
+        matrix[i][i]=1<<EQ_CODE
+    queue=[]
+    for (i,j),r in zip(network['edges'],scenario):
+        mask=matrix[i][j] & (1<<r)
+        if(mask==0):
+            return False
+        matrix[i][j]=mask
+        matrix[j][i]=INVERSE_MASK[mask]
+        queue.append((i,j))
+
+    while(queue):
+        i,j=queue.pop()
+        for k in range(n):
+            if(k==i or k==j):
+                continue
+            #R(i,k) <- R(i,k) /\ R(i,j);R(j,k)
+            mask=matrix[i][k] & COMPOSE_MASK[matrix[i][j]][matrix[j][k]]
+            if(mask!=matrix[i][k]):
+                if(mask==0):
+                    return False
+                matrix[i][k]=mask
+                matrix[k][i]=INVERSE_MASK[mask]
+                queue.append((i,k))
+            #R(k,j) <- R(k,j) /\ R(k,i);R(i,j)
+            mask=matrix[k][j] & COMPOSE_MASK[matrix[k][i]][matrix[i][j]]
+            if(mask!=matrix[k][j]):
+                if(mask==0):
+                    return False
+                matrix[k][j]=mask
+                matrix[j][k]=INVERSE_MASK[mask]
+                queue.append((k,j))
+    return True
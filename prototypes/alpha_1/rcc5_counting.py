@@ -0,0 +1,216 @@
+#!/usr/bin/python3
+
+import itertools
+from rcc5_theory import RCC5_RELATIONS
+from rcc5_algebra import EQ_CODE, INVERSE, COMPOSITION, constraint_network
+
+################################
+# COUNTING THE SAT SCENARIOS (no enumeration)
+# a scenario of a subgraph is sat iff its network (one base relation per pair,
+# the universal relation between the regions that are not paired) is path
+# consistent (see rcc5_algebra.py), that is iff the relations of the pairs can
+# be extended to the pairs of a triangulation of the subgraph so that every
+# triangle is in the composition table (the networks of base relations on
+# the cliques of a chordal graph can be glued together).
+#
+# The triangulation is given by a (min fill) elimination order of the regions:
+# eliminating region v, with N the regions paired with v not yet eliminated,
+# pairs the regions of N (fill-in pairs have no relation in the scenario, any
+# base relation that fits is fine). The regions {v}+N are a bag of a tree
+# decomposition and the pairs of N (the separator) are shared with the bag of
+# the first region of N to be eliminated (the parent bag).
+#
+# The message of a bag to its parent maps each set of allowed relations of
+# the separator pairs (the assignments of the separator that can be extended
+# to the regions eliminated so far) to the number of scenarios of the
+# eliminated pairs with that set: the scenarios are counted once however many
+# ways the fill-in pairs can be chosen. The cost is exponential in the width
+# of the decomposition (2 for cycles and series-parallel subgraphs) instead
+# of in the number of pairs.
+################################
+def _triangle_ok(r_ab, r_bc, r_ac):
+    return (COMPOSITION[(r_ab,r_bc)]>>r_ac)&1==1
+
+def _relation(assignment, a, b):
+    #the relation of (a,b) in an assignment of the pairs (min,max)
+    return assignment[(a,b)] if a<b else INVERSE[assignment[(b,a)]]
+
+def elimination_order(num_nodes, edges):
+    adjacency=[set() for i in range(num_nodes)]
+    for a,b in edges:
+        if(a!=b):
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+    order=[]
+    bags={}
+    remaining=set(range(num_nodes))
+    while(remaining):
+        #min fill (then min degree, then lowest index)
+        def fill(v):
+            neighbours=sorted(adjacency[v])
+            return sum(1 for a,b in itertools.combinations(neighbours,2) if b not in adjacency[a])
+        v=min(remaining, key=lambda v:(fill(v),len(adjacency[v]),v))
+        neighbours=sorted(adjacency[v])
+        for a,b in itertools.combinations(neighbours,2):
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+        for u in neighbours:
+            adjacency[u].discard(v)
+        bags[v]=neighbours
+        order.append(v)
+        remaining.discard(v)
+    return order,bags
+
+#the tree decomposition of the network of pairs_array: the elimination order and
+#bags, the parent and children bags of each bag, the domains of the paired regions (min,max),
+#with the same regions paired twice (possibly swapped) sharing their relation, and
+#the region of the bag where the relation of each pair is counted (None if the
+#pair is a region with itself, which is EQ)
+def tree_decomposition(pairs_array):
+    network=constraint_network(pairs_array)
+    order,bags=elimination_order(network['num_nodes'], network['edges'])
+    position={v:i for i,v in enumerate(order)}
+    parent={}
+    children={v:[] for v in order}
+    for v in order:
+        parent[v]=min(bags[v],key=lambda u:position[u]) if bags[v] else None
+        if(parent[v] is not None):
+            children[parent[v]].append(v)
+    domains={}
+    pair_bag=[]
+    for a,b in network['edges']:
+        if(a==b):
+            pair_bag.append(None)
+            continue
+        pair_bag.append(min(a,b,key=lambda u:position[u]))
+        domains.setdefault((min(a,b),max(a,b)),set(range(len(RCC5_RELATIONS))))
+    return {'network':network,'order':order,'bags':bags,'parent':parent,'children':children,'domains':domains,'pair_bag':pair_bag,
+        'width':max([len(b) for b in bags.values()]+[0])}
+
+#returns the number of sat scenarios of the decomposed pairs and the messages of the
+#bags; allowed restricts the relations of some pairs ({pair index: set of relation
+#codes}), e.g. to count the sat scenarios with a given relation on a pair.
+#The message of a bag only depends on the pairs counted in the bags below it, thus
+#with the messages (and cache, the valid assignments of the bags) of a count without
+#allowed only the bags from the ones of the allowed pairs to the root are computed again
+def count_sat(decomposition, allowed=None, messages=None, cache=None):
+    order=decomposition['order']
+    bags=decomposition['bags']
+    children=decomposition['children']
+    num_relations=len(RCC5_RELATIONS)
+    if(cache is None):
+        cache={}
+
+    #the domains of the counted pairs
+    domains=dict(decomposition['domains'])
+    changed=set()
+    for k,codes in (allowed or {}).items():
+        a,b=decomposition['network']['edges'][k]
+        if(a==b):
+            #a region is EQ to itself
+            if(EQ_CODE not in codes):
+                return 0,{}
+            continue
+        if(a>b):
+            a,b=b,a
+            codes={INVERSE[r] for r in codes}
+        domains[(a,b)]=domains[(a,b)]&set(codes)
+        v=decomposition['pair_bag'][k]
+        while(v is not None and v not in changed):
+            changed.add(v)
+            v=decomposition['parent'][v]
+
+    #the sets of assignments are bitmasks: bit i is the i-th assignment of the
+    #separator pairs (in separator_index) or the i-th valid assignment of a bag
+    result_messages={}
+    total=1
+    for v in order:
+        separator=bags[v]
+        if(messages is not None and v not in changed):
+            message=messages[v]
+        else:
+            #pairs eliminated with v: paired ones are counted, fill-in ones are existential
+            eliminated=[(min(v,u),max(v,u)) for u in separator]
+            counted=[i for i,p in enumerate(eliminated) if p in domains]
+            eliminated_domains=[sorted(domains.get(p,range(num_relations))) for p in eliminated]
+            rows=_bag_rows(decomposition, v, eliminated, counted, eliminated_domains, cache)
+
+            #sets of valid assignments allowed by the children, with their counts
+            states={(1<<len(rows))-1:1}
+            for j,c in enumerate(children[v]):
+                #valid assignments by assignment of the separator of the child
+                child_rows={}
+                for i,row in enumerate(rows):
+                    child_rows[row[2][j]]=child_rows.get(row[2][j],0)|(1<<i)
+                next_states={}
+                for allowed_child,child_count in result_messages[c].items():
+                    mask=0
+                    for child_assignment,rows_mask in child_rows.items():
+                        if((allowed_child>>child_assignment)&1):
+                            mask|=rows_mask
+                    for state,count in states.items():
+                        state&=mask
+                        if(state):
+                            next_states[state]=next_states.get(state,0)+count*child_count
+                states=next_states
+
+            #one scenario of the counted pairs for each of their assignments
+            cells={}
+            for i,row in enumerate(rows):
+                cell=cells.setdefault(row[0],{})
+                cell[row[1]]=cell.get(row[1],0)|(1<<i)
+            message={}
+            for state,count in states.items():
+                for cell in cells.values():
+                    key=0
+                    for s,rows_mask in cell.items():
+                        if(state&rows_mask):
+                            key|=1<<s
+                    if(key):
+                        message[key]=message.get(key,0)+count
+        result_messages[v]=message
+        if(not separator):
+            #root of a connected component of the subgraph
+            total*=sum(message.values())
+    return total,result_messages
+
+#the valid assignments of the bag of v (the triangles of v are in the composition
+#table) as (relations of the counted pairs, index of the assignment of the
+#separator, index of the assignment of the separator of each child)
+def _bag_rows(decomposition, v, eliminated, counted, eliminated_domains, cache):
+    key=('rows',v,tuple(tuple(d) for d in eliminated_domains))
+    if(key in cache):
+        return cache[key]
+    bags=decomposition['bags']
+    separator_pairs=list(itertools.combinations(bags[v],2))
+    child_pairs=[list(itertools.combinations(bags[c],2)) for c in decomposition['children'][v]]
+    rows=[]
+    for s,separator_relations in enumerate(_separator_assignments(decomposition, bags[v])):
+        assignment=dict(zip(separator_pairs,separator_relations))
+        for eliminated_relations in itertools.product(*eliminated_domains):
+            assignment.update(zip(eliminated,eliminated_relations))
+            if(all(_triangle_ok(_relation(assignment,v,a),_relation(assignment,a,b),_relation(assignment,v,b)) for a,b in separator_pairs)):
+                rows.append((tuple(eliminated_relations[i] for i in counted),s,
+                    [_separator_index(decomposition, bags[c], cache)[tuple(_relation(assignment,a,b) for a,b in pairs)] for c,pairs in zip(decomposition['children'][v],child_pairs)]))
+    cache[key]=rows
+    return rows
+
+#the assignments of the pairs of a separator (fill-in pairs have any relation)
+def _separator_assignments(decomposition, separator):
+    return itertools.product(*[sorted(decomposition['domains'].get(p,range(len(RCC5_RELATIONS)))) for p in itertools.combinations(separator,2)])
+
+def _separator_index(decomposition, separator, cache):
+    key=('separator',tuple(separator))
+    if(key not in cache):
+        cache[key]={r:i for i,r in enumerate(_separator_assignments(decomposition, separator))}
+    return cache[key]
+
+#the counts of a subgraph without enumerating its scenarios: counter_sat,
+#counter_unsat and relation_counts[k][r], the number of sat scenarios with
+#relation code r on the pair k of pairs_array
+def count_scenarios(pairs_array):
+    decomposition=tree_decomposition(pairs_array)
+    cache={}
+    sat,messages=count_sat(decomposition, cache=cache)
+    relation_counts=[[count_sat(decomposition, {k:{r}}, messages, cache)[0] for r in range(len(RCC5_RELATIONS))] for k in range(len(pairs_array))]
+    return {'counter_sat':sat,'counter_unsat':len(RCC5_RELATIONS)**len(pairs_array)-sat,'relation_counts':relation_counts,'width':decomposition['width']}
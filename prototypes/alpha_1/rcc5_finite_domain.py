@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+
+#requirements
+# 1) numpy (installed with scipy)
+
+import numpy
+from rcc5_algebra import EQ_CODE, PP_CODE, PPI_CODE, PO_CODE, DR_CODE, constraint_network
+
+################################
+# FINITE DOMAIN RCC5 (no Z3)
+# decides a scenario on the finite domain of rcc_five (rcc5_theory.py): the
+# regions of the subgraph and their subregions (add_minimal_subregions), with
+# P a partial order and O(X,Y) : exists Z (in the domain) P(Z,X) /\ P(Z,Y).
+#
+# A scenario is sat iff its least model is a model:
+# - P is the transitive closure of the P(X,Y) required by EQ, PP and PPi
+#   (plus P(S,X) for each subregion S of X)
+# - PO(X,Y) also requires a common part: the first subregion S of X in the
+#   pair becomes P(S,Y) (any other choice only adds parts to the model)
+# then the negative constraints (not P(Y,X) for PP, not P(X,Y) for PPi,
+# neither for PO and no common part for DR) are checked on the least model.
+# Subregions are never above anything, so P is only closed on the regions
+# (a boolean matrix) and a subregion S of X (witness of PO(X,Y)) is part of
+# the regions above X (or above Y)
+################################
+def finite_domain_model(pairs_array):
+    network=constraint_network(pairs_array)
+    edges=numpy.array(network['edges'],dtype=numpy.intp).reshape(-1,2)
+    return {'num_nodes':network['num_nodes'],'x':edges[:,0],'y':edges[:,1]}
+
+def _transitive_closure(part):
+    #Warshall: P(i,j) <- P(i,j) \/ (P(i,k) /\ P(k,j))
+    for k in range(part.shape[0]):
+        part|=numpy.outer(part[:,k],part[k,:])
+    return part
+
+#scenario can be a prefix (the relations of the first pairs of pairs_array)
+def finite_domain_consistent(model, scenario):
+    n=len(scenario)
+    relations=numpy.asarray(scenario,dtype=numpy.intp)
+    x=model['x'][:n]
+    y=model['y'][:n]
+
+    part=numpy.identity(model['num_nodes'],dtype=bool)
+    below=(relations==EQ_CODE)|(relations==PP_CODE)
+    above=(relations==EQ_CODE)|(relations==PPI_CODE)
+    part[x[below],y[below]]=True
+    part[y[above],x[above]]=True
+    part=_transitive_closure(part)
+
+    #P(X,Y) or P(Y,X) where the scenario excludes it
+    if(part[y[relations==PP_CODE],x[relations==PP_CODE]].any()):
+        return False
+    if(part[x[relations==PPI_CODE],y[relations==PPI_CODE]].any()):
+        return False
+    po=relations==PO_CODE
+    if(part[x[po],y[po]].any() or part[y[po],x[po]].any()):
+        return False
+
+    dr=relations==DR_CODE
+    if(not dr.any()):
+        return True
+    #common parts: the regions and the subregions witnessing a PO
+    partf=part.astype(numpy.uint8)
+    overlap=(partf.T @ partf)>0
+    witnessed=(part[x[po]] | part[y[po]]).astype(numpy.uint8)
+    overlap|=(witnessed.T @ witnessed)>0
+    return not overlap[x[dr],y[dr]].any()
@@ -0,0 +1,135 @@
+#!/usr/bin/python3
+
+#requirements
+# 1) z3 python API (https://github.com/Z3Prover/z3/blob/master/README.md)
+
+from z3 import *
+from progress import start_phase, update_phase, end_phase
+
+#order in which the relations of a pair are enumerated
+#(the index of a relation in this list is its relation code)
+RCC5_RELATIONS=['EQ','PP','PPi','PO','DR']
+
+#declares the Base sort and the rcc5 functions in the context ctx
+#(None is the main Z3 context). Every worker process that checks
+#scenarios needs its own context since Z3 objects cannot be shared
+#between processes
+def declare_theory(ctx=None):
+    #Z3 doesn't (nor any other SMT solver) support sub-sorting
+    #https://stackoverflow.com/questions/36933174/sort-inheritance-in-z3
+    #this may be of interest:
+    #https://stackoverflow.com/questions/12253088/how-to-check-if-a-const-in-z3-is-a-variable-or-a-value
+    Base = DeclareSort('Base',ctx)
+    theory={'Base':Base}
+    theory['P']  = Function('P', Base, Base, BoolSort(ctx))
+    theory['O']  = Function('O', Base, Base, BoolSort(ctx))
+    theory['EQ'] = Function('EQ', Base, Base, BoolSort(ctx))
+    theory['DR'] = Function('DR', Base, Base, BoolSort(ctx))
+    theory['PO'] = Function('PO', Base, Base, BoolSort(ctx))
+    theory['PP'] = Function('PP', Base, Base, BoolSort(ctx))
+    theory['PPi']= Function('PPi', Base, Base, BoolSort(ctx))
+    return theory
+
+# each region in a pair needs to have
+# a subregion to share and one to keep
+# to be able to use RCC5. This would not
+# be necessary if we didn't unfold quantifiers;
+# but unfolding prevents Z3 from unswering unknown 
+# instead of sat/unsat
+#track=False asserts the theory without tracking (no unsat cores, see tracked_solver)
+#the subregions of region X are SX_<n><suffix>
+def add_minimal_subregions(pairs,solver,Base,P,track=True,suffix=""):
+    num_subreg=0
+    regions=set()
+    subregions=set()
+    pairs_array=[]
+    for p1,l in pairs.items():
+        for p2 in l:
+            regions.add(p1)
+            pairs_array.append([p1,p2])
+            for i in range(2):
+                s_name="S"+str(p1)+"_"+str(num_subreg)+suffix
+                s=Const(s_name,Base)
+                subregions.add(s)
+                if(track):
+                    solver.assert_and_track(P(s,p1), str("subregion(%s,%s)"%(s,p1)))
+                else:
+                    solver.add(P(s,p1))
+                num_subreg+=1
+
+            regions.add(p2)
+            for i in range(2):
+                s_name="S"+str(p2)+"_"+str(num_subreg)+suffix
+                s=Const(s_name,Base)
+                subregions.add(s)
+                if(track):
+                    solver.assert_and_track(P(s,p2), str("subregion(%s,%s)"%(s,p2)))
+                else:
+                    solver.add(P(s,p2))
+                num_subreg+=1
+    return {'regions':regions,'subregions':subregions,'pairs_array':pairs_array}
+
+################################
+# add the 5 relation of rcc5 to the solver
+################################
+#track=False asserts the axioms without tracking them (and without formatting their labels)
+def rcc_five(solver, regions_and_subregions, P, O, EQ, PP, PO, PPi, DR, progress=True, track=True):
+    ################################
+    # OVERLAPS          O(X,Y) : exists Z P(Z, X) /\ P(Z, Y) 
+    # EQUAL             EQ(X,Y) : P(X, Y) /\ P(Y, X) 
+    # DESCRETE FROM     DR(X,Y) : not O(X,Y)
+    # PARTIAL OVERLAP   PO(X,Y) : O(X, Y) /\ (not P(X, Y)) /\ (not P(Y, X))
+    # PROPER PART       PP(X,Y) : P(X, Y) /\ (not P(Y, X)) 
+    # PP INVERSE        PPi(X,Y) : P(Y, X) /\ (not P(X, Y)) 
+    ################################
+    def add(axiom, label, *args):
+        if(track):
+            solver.assert_and_track(axiom, label%args)
+        else:
+            solver.add(axiom)
+
+    counter=0
+    l=len(regions_and_subregions)
+    phase=start_phase("rcc5 theory", l**3, progress)
+    for s1 in regions_and_subregions:
+        #solver.add(P(s,s))
+        add(P(s1,s1), "reflexivity(%s1)", s1)
+        for s2 in regions_and_subregions:
+            #solver.add(Implies(And(P(s1,s2),P(s2,s1)), s1==s2))
+            add(Implies(And(P(s1,s2),P(s2,s1)), s1==s2), "asymmetry(%s,%s)", s1, s2)
+            #solver.add(EQ(s1,s2) == And(P(s1,s2), P(s2,s1)))
+            add(EQ(s1,s2) == And(P(s1,s2), P(s2,s1)), "EQ(%s,%s)", s1, s2)
+            #solver.add(DR(s1,s2) == Not(O(s1,s2)))
+            add(DR(s1,s2) == Not(O(s1,s2)), "DR(%s,%s)", s1, s2)
+            #solver.add(PO(s1,s2) == And(O(s1,s2), Not(P(s1,s2)), Not(P(s2,s1))))
+            add(PO(s1,s2) == And(O(s1,s2), Not(P(s1,s2)), Not(P(s2,s1))), "PO(%s,%s)", s1, s2)
+            #solver.add(PP(s1,s2) == And(P(s1,s2), Not(P(s2,s1))))
+            add(PP(s1,s2) == And(P(s1,s2), Not(P(s2,s1))), "PP(%s,%s)", s1, s2)
+            #solver.add(PPi(s1,s2) == PP(s2, s1)) #  And(P(s2,s1), Not(P(s1,s2))))
+            add(PPi(s1,s2) == PP(s2, s1), "PPi(%s,%s)", s1, s2) #  And(P(s2,s1), Not(P(s1,s2))))
+            array=[]
+            for s3 in regions_and_subregions:
+                #solver.add(Implies(And(P(s1,s2),P(s2,s3)), P(s1,s3)))
+                add(Implies(And(P(s1,s2),P(s2,s3)), P(s1,s3)), "transitivity(%s,%s,%s)", s1, s2, s3)
+                #for OVERLAP
+                array.append(And(P(s3,s1),P(s3,s2)))
+            counter+=l
+            update_phase(phase, counter)
+            #solver.add(O(s1,s2) == Or(array)) 
+            add(O(s1,s2) == Or(array), "O(%s,%s) and Z=%s", s1, s2, s3) 
+    end_phase(phase)
+
+#returns a function that returns a solver with the tracked theory of the
+#subgraph pairs, built at its first call. When the solver of the analysis
+#has the theory without tracking, the unsat scenarios are checked again on
+#it to log their unsat core (see scenarios.py)
+def tracked_solver(pairs, theory, ctx=None):
+    state={}
+    def get_solver():
+        if('solver' not in state):
+            solver=Solver(ctx=ctx)
+            regions_subregions_pairs=add_minimal_subregions(pairs,solver,theory['Base'],theory['P'])
+            rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), theory['P'], theory['O'], theory['EQ'], theory['PP'], theory['PO'], theory['PPi'], theory['DR'], progress=False)
+            state['solver']=solver
+        return state['solver']
+    return get_solver
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+#usage: python3 scenario_log.py <spec>.scenarios.jsonl [--results unsat[,sat,unknown]] [--subgraph N]
+#prints the scenarios of the log as the text log of <spec>.out
+
+import json
+import argparse
+from rcc5_theory import RCC5_RELATIONS
+
+################################
+# SCENARIO LOG
+# the checked scenarios are written in <output>/<spec>.scenarios.jsonl
+# (buffered, one json object per line) instead of their Z3 formula:
+# - {"subgraph":id,"pairs":[[region,region],...]} before the scenarios of a subgraph
+# - {"i":index,"r":result,"t":[relation codes]} per scenario, with index as in
+#   scenario_from_index (scenarios.py) and result "sat", "unsat" or "unknown"
+#   "n":count if the record is a range of scenarios decided by a prefix t
+#   (backtracking) and, for the unsat ones, "why":prefilter if the prefilter
+#   decided it, "why":"nogood" (with the nogood as [[pair,relation],...] in
+#   "nogood") or, if Z3 checked it, the unsat core in "core"
+# results filters the records written (e.g. ("unsat",)), None writes all of them
+################################
+def open_scenario_log(filename, mode="w", results=None, buffering=1<<20):
+    return {'file':open(filename, mode, buffering=buffering),'results':None if results is None else set(results)}
+
+def write_subgraph(log, subgraph_id, pairs_array):
+    log['file'].write(json.dumps({'subgraph':subgraph_id,'pairs':[[str(p1),str(p2)] for p1,p2 in pairs_array]})+"\n")
+
+def write_scenario(log, index, check, scenario, count=1, why=None, nogood=None, core=None):
+    result=str(check)
+    if(log['results'] is not None and result not in log['results']):
+        return
+    record={'i':index,'r':result,'t':list(scenario)}
+    if(count!=1):
+        record['n']=count
+    if(why is not None):
+        record['why']=why
+    if(nogood is not None):
+        record['nogood']=[list(l) for l in nogood]
+    if(core is not None):
+        record['core']=[str(k) for k in core]
+    log['file'].write(json.dumps(record,separators=(',',':'))+"\n")
+
+def close_scenario_log(log):
+    log['file'].close()
+
+#yields (subgraph, pairs, record) for each scenario record in the log,
+#where subgraph is the number (from 1) of the subgraph in the log
+def read_scenario_log(filename):
+    subgraph=0
+    pairs=[]
+    with open(filename) as f:
+        for line in f:
+            record=json.loads(line)
+            if('subgraph' in record):
+                subgraph+=1
+                pairs=record['pairs']
+                continue
+            yield subgraph,pairs,record
+
+def scenario_to_str(pairs, scenario):
+    return "And(%s)"%", ".join("%s(%s, %s)"%(RCC5_RELATIONS[r],pairs[i][0],pairs[i][1]) for i,r in enumerate(scenario))
+
+def record_to_str(pairs, record):
+    text=""
+    if(record.get('why') in ("filter","closure")):
+        text+="PATH INCONSISTENT\n"
+    elif(record.get('why')=="finite_domain"):
+        text+="NO FINITE MODEL\n"
+    elif(record.get('why')=="nogood"):
+        text+="NOGOOD %s\n"%", ".join("%s(%s, %s)"%(RCC5_RELATIONS[r],pairs[i][0],pairs[i][1]) for i,r in record['nogood'])
+    elif('core' in record):
+        text+="UNSAT CORE\n"+"".join("%s\n"%k for k in record['core'])
+    count=record.get('n',1)
+    if(count==1):
+        text+="%d %s\n %s\n"%(record['i']+1, record['r'], scenario_to_str(pairs, record['t']))
+    else:
+        text+="%d-%d %s\n %s\n"%(record['i']+1, record['i']+count, record['r'], scenario_to_str(pairs, record['t']))
+    return text
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Print the scenarios of a scenario log")
+    parser.add_argument("log", help="<spec>.scenarios.jsonl in output_secra")
+    parser.add_argument("--results", default=None, help="comma separated results to print (sat,unsat,unknown)")
+    parser.add_argument("--subgraph", type=int, default=None, help="print only the scenarios of the N-th subgraph (from 1)")
+    args=parser.parse_args()
+    results=None if args.results is None else set(args.results.split(","))
+    for subgraph,pairs,record in read_scenario_log(args.log):
+        if(args.subgraph is not None and subgraph!=args.subgraph):
+            continue
+        if(results is not None and record['r'] not in results):
+            continue
+        print(record_to_str(pairs, record))
@@ -0,0 +1,631 @@
+#!/usr/bin/python3
+
+#requirements
+# 1) z3 python API (https://github.com/Z3Prover/z3/blob/master/README.md)
+
+import os
+import time
+import itertools
+import shutil
+import multiprocessing
+import numpy
+from z3 import *
+from progress import start_phase, update_phase, end_phase
+from scenario_log import open_scenario_log, write_scenario, close_scenario_log
+from rcc5_theory import RCC5_RELATIONS, declare_theory, add_minimal_subregions, rcc_five, tracked_solver
+from rcc5_algebra import constraint_network, path_consistent
+from rcc5_finite_domain import finite_domain_model, finite_domain_consistent
+
+#a scenario of a subgraph with k pairs is a tuple of k relation codes
+#(indexes in RCC5_RELATIONS). Scenarios are enumerated in the order of
+#itertools.product, so the index of a scenario is the base-5 number
+#whose most significant digit is the relation code of the first pair
+def scenario_from_index(index, num_pairs):
+    scenario=[0]*num_pairs
+    for i in range(num_pairs-1,-1,-1):
+        index,scenario[i]=divmod(index,len(RCC5_RELATIONS))
+    return tuple(scenario)
+
+def index_from_scenario(scenario):
+    index=0
+    for r in scenario:
+        index=index*len(RCC5_RELATIONS)+r
+    return index
+
+#the result of an engine (counters are summed when merging results)
+def empty_result():
+    return {'counter_sat':0,'counter_unsat':0,'counter_unknown':0,'insecure':[],'avoided':0,'checks':0,'pruned':0,'nogoods':0,'nogood_hits':0,'check_time':0.0}
+
+#adds result (of the scenarios following the ones of merged) to merged
+def merge_results(merged, result):
+    for k,v in result.items():
+        if(k=='insecure'):
+            merged[k].extend(v)
+        elif(isinstance(v,(int,float))):
+            merged[k]=merged.get(k,0)+v
+    return merged
+
+################################
+# CONFLICT LEARNING
+# when the relations of a scenario are tracked, the unsat core of an unsat
+# scenario contains the (pair,relation) that cannot hold together, i.e. a
+# nogood. Every later scenario containing a nogood is unsat and is not
+# checked by Z3. Nogoods are indexed by their literal with the highest pair
+# index, which is the literal that completes them in pairs_array order.
+# Cores are not minimized (core.minimize) since that costs more solver
+# time than the checks saved by the smaller nogoods
+################################
+def scenario_literal_labels(pairs_array):
+    labels={}
+    for i in range(len(pairs_array)):
+        for r in range(len(RCC5_RELATIONS)):
+            labels["scenario(%d,%s)"%(i,RCC5_RELATIONS[r])]=(i,r)
+    return labels
+
+#asserts the relation r of the i-th pair tracked by its label
+def assert_scenario_literal(solver, relation, i, r):
+    solver.assert_and_track(relation, "scenario(%d,%s)"%(i,RCC5_RELATIONS[r]))
+
+def nogood_from_core(core, labels):
+    nogood=[]
+    for k in core:
+        if(str(k) in labels):
+            nogood.append(labels[str(k)])
+    return tuple(sorted(nogood))
+
+def add_nogood(nogoods, nogood):
+    if(nogood==()):
+        return False
+    key=nogood[-1]
+    if(key not in nogoods):
+        nogoods[key]=[]
+    if(nogood in nogoods[key]):
+        return False
+    nogoods[key].append(nogood)
+    return True
+
+#returns a nogood contained in scenario (None if there isn't one)
+#levels are the pair indexes whose nogoods are looked up (all by default)
+def find_nogood(nogoods, scenario, levels=None):
+    if(levels is None):
+        levels=range(len(scenario))
+    for i in levels:
+        for nogood in nogoods.get((i,scenario[i]),()):
+            if(all(scenario[j]==r for j,r in nogood)):
+                return nogood
+    return None
+
+def nogood_to_str(nogood, pairs_array):
+    return ", ".join("%s(%s, %s)"%(RCC5_RELATIONS[r],pairs_array[i][0],pairs_array[i][1]) for i,r in nogood)
+
+################################
+# ASSUMPTION LITERALS
+# one Bool literal per (pair,relation), named as the tracked scenario
+# literals (so that unsat cores give nogoods in the same way), is built
+# once per subgraph with lit(i,R) -> R(pair_i). A scenario is then checked
+# with solver.check(*literals) without creating Z3 ASTs nor push/pop,
+# and the solver keeps what it learns between scenarios
+################################
+def prepare_scenario_literals(solver, rcc5, pairs_array):
+    literals=[]
+    strings=[]
+    for i in range(len(pairs_array)):
+        ctx=pairs_array[i][0].ctx
+        literals.append([])
+        strings.append([])
+        for r in range(len(rcc5)):
+            relation=rcc5[r](pairs_array[i])
+            lit=Bool("scenario(%d,%s)"%(i,RCC5_RELATIONS[r]),ctx)
+            solver.add(Implies(lit,relation))
+            literals[i].append(lit)
+            strings[i].append(str(relation))
+    return {'literals':literals,'strings':strings}
+
+################################
+# UNSAT CORES ON DEMAND
+# the solver of the analysis can have the theory without tracking (see
+# rcc_five): it is faster to build and to check, but its unsat cores are
+# empty. core_solver() returns a solver with the tracked theory of the
+# subgraph (see tracked_solver) and each unsat scenario is checked again on
+# it, as the engine checks it on a tracked solver, to log its unsat core
+# (and to learn its nogood). With assumptions, literals are the assumption
+# literals prepared on the tracked solver
+################################
+def recheck_unsat_core(core_solver, array_scenario, t, learning, literals=None):
+    solver=core_solver()
+    if(literals is not None):
+        check=solver.check(*[literals['literals'][i][t[i]] for i in range(len(t))])
+        return solver.unsat_core() if check == unsat else []
+    solver.push()
+    if(learning):
+        for i in range(len(t)):
+            assert_scenario_literal(solver, array_scenario[i], i, t[i])
+    else:
+        solver.add(And(array_scenario))
+    check=solver.check()
+    core=solver.unsat_core() if check == unsat else []
+    solver.pop()
+    return core
+
+#the prefilters that decide every scenario (the solver needs no rcc5 theory)
+DECIDING_PREFILTERS=("closure","finite_domain")
+INCONSISTENT_LOG={'filter':"PATH INCONSISTENT",'closure':"PATH INCONSISTENT",'finite_domain':"NO FINITE MODEL"}
+
+#returns the function (scenario -> True/False) of prefilter, None if there is no prefilter
+#(scenarios can be prefixes, i.e. the relations of the first pairs of pairs_array)
+def consistency_check(prefilter, pairs_array):
+    if(prefilter is None):
+        return None
+    if(prefilter=="finite_domain"):
+        model=finite_domain_model(pairs_array)
+        return lambda scenario: finite_domain_consistent(model, scenario)
+    network=constraint_network(pairs_array)
+    return lambda scenario: path_consistent(network, scenario)
+
+#checks the scenarios with index in [start,stop) on solver (that already
+#contains the rcc5 theory of the subgraph) and writes them in the log f
+#returns the sat/unsat/unknown counters and the (ordered) list of
+#the sat scenarios with at least one insecure relation (i.e. not EQ)
+#prefilter:
+# - None: every scenario is checked by Z3
+# - "filter": scenarios that are not path consistent (see rcc5_algebra.py)
+#   are unsat and are not checked by Z3
+# - "closure": no scenario is checked by Z3, path consistency decides sat/unsat
+# - "finite_domain": no scenario is checked by Z3, the finite domain backend
+#   (see rcc5_finite_domain.py) decides sat/unsat
+#learning: learn nogoods from the unsat cores and skip the scenarios containing them
+#assumptions: check scenarios with assumption literals (see prepare_scenario_literals)
+#the result also contains the time spent in solver.check (check_time)
+#on_checkpoint(next_index, result) is called after each scenario (see checkpoint.py)
+#core_solver: the unsat cores are taken from it (see recheck_unsat_core), None if solver is tracked
+#log: the scenarios are written in the scenario log (see scenario_log.py) instead of f
+def check_scenarios(solver, theory, pairs_array, start, stop, f, progress=True, prefilter=None, learning=False, assumptions=False, on_checkpoint=None, core_solver=None, log=None):
+    rcc5=[theory[r] for r in RCC5_RELATIONS]
+    result={'counter_sat':0,'counter_unsat':0,'counter_unknown':0,'insecure':[],'avoided':0,'checks':0,'nogoods':0,'nogood_hits':0,'check_time':0.0}
+    literals=None
+    if(assumptions):
+        #the literals are removed with the pop at the end of the subgraph
+        solver.push()
+        literals=prepare_scenario_literals(solver, rcc5, pairs_array)
+    core_literals=None
+    consistency=consistency_check(prefilter, pairs_array)
+    nogoods={}
+    if(learning):
+        labels=scenario_literal_labels(pairs_array)
+    num_scenarios=stop-start
+    counter=start+1
+    phase=start_phase("scenarios", num_scenarios, progress)
+
+    # https://stackoverflow.com/questions/36802314/python-itertools-product-start-from-certain
+    for t in itertools.islice(itertools.product(range(len(rcc5)), repeat=len(pairs_array)), start, stop):
+        if(literals is None):
+            array_scenario=[]
+            for i in range(len(t)):
+                array_scenario.append(rcc5[t[i]](pairs_array[i]))
+            scenario=And(array_scenario)
+
+        consistent=None
+        if(consistency is not None):
+            consistent=consistency(t)
+        nogood=None
+        if(learning and consistent is not False):
+            nogood=find_nogood(nogoods,t)
+        core=None
+
+        if(consistent is False):
+            result['avoided']+=1
+            check=unsat
+            if(log is None):
+                f.write("%s\n"%INCONSISTENT_LOG[prefilter])
+        elif(nogood is not None):
+            result['avoided']+=1
+            result['nogood_hits']+=1
+            check=unsat
+            if(log is None):
+                f.write("NOGOOD %s\n"%nogood_to_str(nogood,pairs_array))
+        elif(consistent and prefilter in DECIDING_PREFILTERS):
+            result['avoided']+=1
+            check=sat
+        else:
+            if(literals is not None):
+                result['checks']+=1
+                check_time=time.time()
+                check=solver.check(*[literals['literals'][i][t[i]] for i in range(len(t))])
+                result['check_time']+=time.time()-check_time
+            else:
+                solver.push()
+                if(learning):
+                    for i in range(len(t)):
+                        assert_scenario_literal(solver, array_scenario[i], i, t[i])
+                else:
+                    solver.add(scenario)
+                result['checks']+=1
+                check_time=time.time()
+                check=solver.check()
+                result['check_time']+=time.time()-check_time
+            if(check == unsat):
+                if(core_solver is None):
+                    core=solver.unsat_core()
+                else:
+                    if(literals is not None and core_literals is None):
+                        core_solver().push()
+                        core_literals=prepare_scenario_literals(core_solver(), rcc5, pairs_array)
+                    core=recheck_unsat_core(core_solver, None if literals is not None else array_scenario, t, learning, core_literals)
+                if(log is None):
+                    f.write("UNSAT CORE\n")
+                    for k in core:
+                        f.write('%s=%s\n'%(k, core[k]))
+                if(learning and add_nogood(nogoods,nogood_from_core(core,labels))):
+                    result['nogoods']+=1
+            if(literals is None):
+                solver.pop()
+
+        if(check == unsat):
+            result['counter_unsat']+=1
+        if(check == unknown):
+            result['counter_unknown']+=1
+        if(check == sat):
+            result['counter_sat']+=1
+            #EQ (code 0) is the only secure relation
+            if(any(t)):
+                result['insecure'].append(t)
+
+        #TODO
+        #https://stackoverflow.com/questions/14628279/z3-convert-z3py-expression-to-smt-lib2/14629021#14629021
+        #https://stackoverflow.com/questions/19569431/z3py-print-large-formula-with-144-variables
+        if(log is not None):
+            why=prefilter if consistent is False else ("nogood" if nogood is not None else None)
+            write_scenario(log, counter-1, check, t, why=why, nogood=nogood, core=core)
+        elif(literals is not None):
+            f.write("%d %s\n And(%s)\n\n"%(counter, check, ", ".join(literals['strings'][i][t[i]] for i in range(len(t)))))
+        else:
+            f.write("%d %s\n %s\n\n"%(counter, check, str(scenario).replace('\n','')))
+
+        counter+=1
+        if(on_checkpoint is not None):
+            on_checkpoint(counter-1, result)
+        update_phase(phase, counter-1-start, checks=result['checks'])
+    end_phase(phase, checks=result['checks'])
+    if(assumptions):
+        solver.pop()
+    if(core_literals is not None):
+        core_solver().pop()
+    return result
+
+################################
+# BACKTRACKING ENUMERATION
+# depth-first search over pairs_array: level d assigns the relation of the
+# d-th pair (in the order of RCC5_RELATIONS, so leaves are visited in the
+# same order of itertools.product) and is kept in the solver with push/pop.
+# If a partial assignment is unsat, every scenario extending it is unsat
+# and its subtree is cut without checking it
+################################
+#(assumptions is an option of the product engine, here partial scenarios are kept with push/pop)
+def check_scenarios_backtracking(solver, theory, pairs_array, start, stop, f, progress=True, prefilter=None, learning=False, assumptions=False, on_checkpoint=None, core_solver=None, log=None):
+    rcc5=[theory[r] for r in RCC5_RELATIONS]
+    result={'counter_sat':0,'counter_unsat':0,'counter_unknown':0,'insecure':[],'avoided':0,'checks':0,'pruned':0,'nogoods':0,'nogood_hits':0,'check_time':0.0}
+    consistency=consistency_check(prefilter, pairs_array)
+    nogoods={}
+    if(learning):
+        labels=scenario_literal_labels(pairs_array)
+    num_pairs=len(pairs_array)
+    num_scenarios=stop-start
+    state={'done':0}
+    phase=start_phase("scenarios", num_scenarios, progress)
+
+    def decided(first, last, check, prefix, array_prefix, why=None, nogood=None, core=None):
+        #scenarios [first,last) have result check
+        num=last-first
+        if(check == unsat):
+            result['counter_unsat']+=num
+        elif(check == unknown):
+            result['counter_unknown']+=num
+        elif(check == sat):
+            result['counter_sat']+=num
+            if(any(prefix)):
+                result['insecure'].append(tuple(prefix))
+        if(num!=1):
+            result['pruned']+=1
+        if(log is not None):
+            write_scenario(log, first, check, prefix, count=num, why=why, nogood=nogood, core=core)
+        elif(num==1):
+            f.write("%d %s\n %s\n\n"%(first+1, check, str(And(array_prefix)).replace('\n','')))
+        else:
+            f.write("%d-%d %s\n %s\n\n"%(first+1, last, check, str(And(array_prefix)).replace('\n','')))
+        state['done']+=num
+        #scenarios are decided in index order
+        if(on_checkpoint is not None):
+            on_checkpoint(start+state['done'], result)
+        update_phase(phase, state['done'], checks=result['checks'], pruned=result['pruned'])
+
+    def visit(prefix, array_prefix, index):
+        #the subtree of prefix contains the scenarios [index*5^m,(index+1)*5^m)
+        level=len(prefix)
+        subtree=len(rcc5)**(num_pairs-level)
+        first=max(index*subtree,start)
+        last=min((index+1)*subtree,stop)
+        if(first>=last):
+            return
+
+        consistent=None
+        if(consistency is not None and level>0):
+            consistent=consistency(prefix)
+        nogood=None
+        if(learning and level>0 and consistent is not False):
+            #the nogoods not completed by the last pair have been looked up by the ancestors
+            nogood=find_nogood(nogoods,prefix,[level-1])
+
+        if(consistent is False):
+            result['avoided']+=1
+            if(log is None):
+                f.write("%s\n"%INCONSISTENT_LOG[prefilter])
+            decided(first, last, unsat, prefix, array_prefix, why=prefilter)
+            return
+        elif(nogood is not None):
+            result['avoided']+=1
+            result['nogood_hits']+=1
+            if(log is None):
+                f.write("NOGOOD %s\n"%nogood_to_str(nogood,pairs_array))
+            decided(first, last, unsat, prefix, array_prefix, why="nogood", nogood=nogood)
+            return
+        elif(consistent and prefilter in DECIDING_PREFILTERS):
+            check=sat
+        elif(level>0):
+            result['checks']+=1
+            check_time=time.time()
+            check=solver.check()
+            result['check_time']+=time.time()-check_time
+            if(check == unsat):
+                if(core_solver is None):
+                    core=solver.unsat_core()
+                else:
+                    core=recheck_unsat_core(core_solver, array_prefix, prefix, learning)
+                if(log is None):
+                    f.write("UNSAT CORE\n")
+                    for k in core:
+                        f.write('%s=%s\n'%(k, core[k]))
+                if(learning and add_nogood(nogoods,nogood_from_core(core,labels))):
+                    result['nogoods']+=1
+                decided(first, last, unsat, prefix, array_prefix, core=core)
+                return
+        else:
+            check=sat
+
+        if(level==num_pairs):
+            decided(first, last, check, prefix, array_prefix)
+            return
+
+        for r in range(len(rcc5)):
+            relation=rcc5[r](pairs_array[level])
+            solver.push()
+            if(learning):
+                assert_scenario_literal(solver, relation, level, r)
+            else:
+                solver.add(relation)
+            visit(prefix+[r], array_prefix+[relation], index*len(rcc5)+r)
+            solver.pop()
+
+    visit([], [], 0)
+    end_phase(phase, checks=result['checks'], pruned=result['pruned'])
+    return result
+
+################################
+# ALLSAT ENUMERATION
+# each pair i has five selectors sel(i,EQ),...,sel(i,DR), exactly one of
+# them is true and sel(i,R) -> R(pair_i). Every model of the solver is a sat
+# scenario, which is then blocked with a clause over its selectors, so the
+# number of solver calls is the number of sat scenarios (+1) instead of 5^k.
+# Unsat scenarios are never visited; the models are sorted in enumeration
+# order to record them as the other engines do. It works on the whole
+# scenario space and ignores prefilter, learning, assumptions and core_solver
+# (on_checkpoint is called only when the enumeration is completed)
+################################
+def check_scenarios_allsat(solver, theory, pairs_array, start, stop, f, progress=True, prefilter=None, learning=False, assumptions=False, on_checkpoint=None, core_solver=None, log=None):
+    rcc5=[theory[r] for r in RCC5_RELATIONS]
+    num_scenarios=len(rcc5)**len(pairs_array)
+    if(start!=0 or stop!=num_scenarios):
+        raise ValueError("allsat enumerates the whole scenario space, not [%d,%d)"%(start,stop))
+    result={'counter_sat':0,'counter_unsat':0,'counter_unknown':0,'insecure':[],'avoided':0,'checks':0,'check_time':0.0}
+
+    solver.push()
+    selectors=[]
+    for i in range(len(pairs_array)):
+        ctx=pairs_array[i][0].ctx
+        sel=[Bool("sel(%d,%s)"%(i,RCC5_RELATIONS[r]),ctx) for r in range(len(rcc5))]
+        for r in range(len(rcc5)):
+            solver.add(Implies(sel[r],rcc5[r](pairs_array[i])))
+        solver.add(PbEq([(x,1) for x in sel],1))
+        selectors.append(sel)
+
+    models=[]
+    #the number of sat scenarios is not known in advance
+    phase=start_phase("sat scenarios", None, progress)
+    while(True):
+        result['checks']+=1
+        check_time=time.time()
+        check=solver.check()
+        result['check_time']+=time.time()-check_time
+        if(check != sat):
+            if(check == unknown):
+                #the scenarios not found yet are not known to be unsat
+                result['counter_unknown']=num_scenarios-len(models)
+            break
+        model=solver.model()
+        t=[]
+        for sel in selectors:
+            for r in range(len(rcc5)):
+                if(is_true(model.eval(sel[r],model_completion=True))):
+                    t.append(r)
+                    break
+        models.append(tuple(t))
+        #block the scenario (projection of the model over the selectors)
+        solver.add(Or([Not(selectors[i][t[i]]) for i in range(len(t))]))
+        update_phase(phase, len(models))
+    solver.pop()
+    end_phase(phase, checks=result['checks'])
+
+    models.sort()
+    for t in models:
+        result['counter_sat']+=1
+        if(any(t)):
+            result['insecure'].append(t)
+        if(log is not None):
+            write_scenario(log, index_from_scenario(t), sat, t)
+        else:
+            array_scenario=[rcc5[t[i]](pairs_array[i]) for i in range(len(t))]
+            f.write("%d %s\n %s\n\n"%(index_from_scenario(t)+1, sat, str(And(array_scenario)).replace('\n','')))
+    result['counter_unsat']=num_scenarios-result['counter_sat']-result['counter_unknown']
+    if(on_checkpoint is not None):
+        on_checkpoint(stop, result)
+    return result
+
+#engines that check the scenarios of a subgraph in [start,stop)
+ENGINES={'product':check_scenarios,'backtracking':check_scenarios_backtracking,'allsat':check_scenarios_allsat}
+
+#adds the sat insecure scenarios of a subgraph to risk_structure and cyclic_risk_struct
+#scenarios must be given in enumeration order so that the report is the same
+#regardless of how (and by how many processes) the scenarios have been checked
+#cyclic_risk_struct[subgraph_id] keeps the names of the pairs and a matrix of
+#relation codes (one row per scenario, one uint8 column per pair) instead of
+#the Z3 relations of the scenarios (see cyclic_scenario_relations)
+#For a biconnected block (see graph_decomposition.py) of the subgraph block_of,
+#each scenario of the block stands for weight scenarios of the subgraph (the
+#product of the sat scenarios of the other blocks) and the secure scenario
+#(all EQ) is kept as the first row, since the scenarios of the blocks are
+#combined by product in the report
+def record_insecure_scenarios(risk_structure, cyclic_risk_struct, subgraph_id, pairs_array, insecure, weight=1, block_of=None):
+    rows=insecure if block_of is None else [(0,)*len(pairs_array)]+list(insecure)
+    cyclic_risk_struct[subgraph_id]={'pairs':[[str(p1),str(p2)] for p1,p2 in pairs_array],'scenarios':numpy.array(rows,dtype=numpy.uint8).reshape(len(rows),len(pairs_array))}
+    if(block_of is not None):
+        cyclic_risk_struct[subgraph_id]['block_of']=block_of
+    for t in insecure:
+        risk_tmp=[]
+        for i in range(len(t)):
+            if(t[i]!=0):
+                risk_tmp.append([RCC5_RELATIONS[t[i]].lower(),pairs_array[i]])
+
+        for r1 in risk_tmp:
+            if(tuple(r1[1]) not in risk_structure[r1[0]]):
+                risk_structure[r1[0]][tuple(r1[1])]={}
+                risk_structure[r1[0]][tuple(r1[1])]['direct_weight']=0
+                risk_structure[r1[0]][tuple(r1[1])]['type']="cyclic"
+                risk_structure[r1[0]][tuple(r1[1])]['indirect_weight']={'subgraph':subgraph_id}
+            risk_structure[r1[0]][tuple(r1[1])]['direct_weight']+=weight
+        for r2 in risk_tmp:
+            if(r1[1] != r2[1]):
+                if(tuple(r2[1]) not in risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'].keys()):
+                    risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'][tuple(r2[1])]={'dr':0,'pp':0,'ppi':0,'po':0}
+                risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'][tuple(r2[1])][r2[0]]+=weight
+
+#like record_insecure_scenarios for a subgraph whose scenarios are counted and not
+#enumerated (see rcc5_counting.py): the direct weights are the counts of the sat
+#scenarios with each relation and cyclic_risk_struct[subgraph_id] has the number
+#of rows the scenarios would have ('count') instead of the scenarios, thus there
+#are no indirect weights (they are not used by the report)
+def record_scenario_counts(risk_structure, cyclic_risk_struct, subgraph_id, pairs_array, result, weight=1, block_of=None):
+    count=result['counter_sat'] if block_of is not None else result['counter_sat']-1
+    cyclic_risk_struct[subgraph_id]={'pairs':[[str(p1),str(p2)] for p1,p2 in pairs_array],'count':count}
+    if(block_of is not None):
+        cyclic_risk_struct[subgraph_id]['block_of']=block_of
+    for i in range(len(pairs_array)):
+        for code,relation_count in enumerate(result['relation_counts'][i]):
+            if(code==0 or relation_count==0):
+                continue
+            relation=RCC5_RELATIONS[code].lower()
+            if(tuple(pairs_array[i]) not in risk_structure[relation]):
+                risk_structure[relation][tuple(pairs_array[i])]={'direct_weight':0,'type':"cyclic",'indirect_weight':{'subgraph':subgraph_id}}
+            risk_structure[relation][tuple(pairs_array[i])]['direct_weight']+=relation_count*weight
+
+#yields, per scenario in cyclic_risk_struct[subgraph_id], the list of its relations
+#as strings (e.g. "PO(A1, B2)", as the Z3 relation would be printed)
+def cyclic_scenario_relations(subgraph):
+    labels=[["%s(%s, %s)"%(r,p1,p2) for r in RCC5_RELATIONS] for p1,p2 in subgraph['pairs']]
+    for row in subgraph['scenarios']:
+        yield [labels[i][code] for i,code in enumerate(row)]
+
+################################
+# PARALLEL ENUMERATION
+# the index space [0,5^k) of the scenarios is split in contiguous shards.
+# Each worker process has its own Z3 context, solver and copy of the
+# rcc5 theory of the subgraph, checks the shards it receives and writes
+# their log in a separate file. Shards are merged in index order, thus
+# counters, risk_structure and cyclic_risk_struct are the same as the ones
+# of the serial enumeration
+################################
+def split_shards(num_scenarios, num_shards):
+    num_shards=max(1,min(num_shards,num_scenarios))
+    bounds=[(num_scenarios*i)//num_shards for i in range(num_shards+1)]
+    return [(bounds[i],bounds[i+1]) for i in range(num_shards)]
+
+#the theory of the subgraph in a worker process
+_worker={}
+
+#sub_pairs is the adjacency list of the subgraph with region names
+#instead of Z3 constants: [(name,[name1,name2,...]),...]
+#track=False builds the theory without tracking (and a tracked solver for the unsat cores)
+#the rcc5 theory is not needed if prefilter decides every scenario (as in analyze_block)
+def _init_worker(sub_pairs, track=True, prefilter=None):
+    z3.set_param('parallel.enable', False)
+    ctx=Context()
+    theory=declare_theory(ctx)
+    solver=Solver(ctx=ctx)
+    pairs={}
+    for p1,l in sub_pairs:
+        pairs[Const(p1,theory['Base'])]=[Const(p2,theory['Base']) for p2 in l]
+    regions_subregions_pairs=add_minimal_subregions(pairs,solver,theory['Base'],theory['P'],track)
+    if(prefilter not in DECIDING_PREFILTERS):
+        rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), theory['P'], theory['O'], theory['EQ'], theory['PP'], theory['PO'], theory['PPi'], theory['DR'], progress=False, track=track)
+    _worker['core_solver']=None if track else tracked_solver(pairs, theory, ctx)
+    _worker['theory']=theory
+    _worker['solver']=solver
+    _worker['pairs_array']=regions_subregions_pairs['pairs_array']
+
+#structured: the shard is logged as a scenario log with the results in log_results (see scenario_log.py)
+def _check_shard(job):
+    shard_id,start,stop,log_path,prefilter,engine,learning,assumptions,structured,log_results=job
+    if(structured):
+        log=open_scenario_log(log_path, "w", log_results)
+        result=ENGINES[engine](_worker['solver'], _worker['theory'], _worker['pairs_array'], start, stop, log['file'], progress=False, prefilter=prefilter, learning=learning, assumptions=assumptions, core_solver=_worker['core_solver'], log=log)
+        close_scenario_log(log)
+    else:
+        with open(log_path,"w+") as f:
+            result=ENGINES[engine](_worker['solver'], _worker['theory'], _worker['pairs_array'], start, stop, f, progress=False, prefilter=prefilter, learning=learning, assumptions=assumptions, core_solver=_worker['core_solver'])
+    result['shard']=shard_id
+    result['log']=log_path
+    return result
+
+#checks the scenarios [start,5^num_pairs) of the subgraph sub_pairs ({region:[region,...]})
+#with a pool of workers processes and appends the logs of the shards to f
+#(to the scenario log if log is not None, see scenario_log.py)
+#returns the same structure of check_scenarios
+def check_scenarios_parallel(sub_pairs, num_pairs, f, log_path, workers, shards_per_worker=8, prefilter=None, engine="product", learning=False, assumptions=False, on_checkpoint=None, start=0, track=True, log=None):
+    num_scenarios=len(RCC5_RELATIONS)**num_pairs
+    named_pairs=[(str(p1),[str(p2) for p2 in l]) for p1,l in sub_pairs.items()]
+    shards=[(start+a,start+b) for a,b in split_shards(num_scenarios-start, workers*shards_per_worker)]
+    if(log is not None):
+        f=log['file']
+        log_path=f.name
+        #the children must not inherit the buffer of the log
+        f.flush()
+    jobs=[(i,first,last,"%s.shard%d"%(log_path,i),prefilter,engine,learning,assumptions,log is not None,None if log is None else log['results']) for i,(first,last) in enumerate(shards)]
+
+    merged=empty_result()
+    done=start
+    phase=start_phase("scenarios", num_scenarios-start)
+    # fork: the children inherit the imported modules instead of importing them again
+    pool_context=multiprocessing.get_context("fork")
+    with pool_context.Pool(processes=workers, initializer=_init_worker, initargs=(named_pairs,track,prefilter)) as pool:
+        #imap returns the shards in order
+        for result in pool.imap(_check_shard, jobs):
+            shard_id=result.pop('shard')
+            shard_log_path=result.pop('log')
+            merge_results(merged,result)
+            with open(shard_log_path) as shard_log:
+                shutil.copyfileobj(shard_log, f)
+            os.remove(shard_log_path)
+            done=shards[shard_id][1]
+            if(on_checkpoint is not None):
+                on_checkpoint(done, merged)
+            update_phase(phase, done-start, shards="%d/%d"%(shard_id+1,len(shards)))
+    end_phase(phase, checks=merged['checks'])
+    return merged
@@ -5,44 +5,93 @@
 # 1) z3 python API (https://github.com/Z3Prover/z3/blob/master/README.md)
 
 import sys
+import math
 import time
+import argparse
 from z3 import *
 import scipy.special
 import itertools
 from parse_model import get_components_from_xmi, create_model_dot
+from progress import PROGRESS_MODES, set_progress_mode, phase_timings, clear_timings
+from rcc5_theory import declare_theory, add_minimal_subregions, rcc_five, tracked_solver
+from scenarios import ENGINES, DECIDING_PREFILTERS, check_scenarios_parallel, record_insecure_scenarios, record_scenario_counts, cyclic_scenario_relations, merge_results, empty_result
+from checkpoint import checkpoint_filename, new_checkpoint, load_checkpoint, truncate_to_checkpoint, resume_subgraph, subgraph_checkpointer
+from subgraph_cache import canonical_form, lookup_subgraph, store_subgraph
+from manifest import manifest_filename, new_manifest, load_manifest, save_manifest, record_subgraph, reuse_subgraph
+from scenario_log import open_scenario_log, write_subgraph, close_scenario_log
+from model_cache import model_cache_key, lookup_model, store_model
+from graph_decomposition import decompose, biconnected_blocks
+from rcc5_counting import count_scenarios
 import pprint
 import xlsxwriter
 import pydot
 
 RCC_CONFIGURATIONS=5 #we assume RCC5
 INSECURITY_CONFIGURATIONS=4 #RCC5 without EQ which we assume secure
+PREPARED_SOLVERS=32 #solvers of cyclic subgraphs kept between analyses (see prepare_block_solver)
 spec_package="UC1-CPS"
 #spec_package="TwoGuysTalking"
 xmi_filename="Engineering.xmi"
-
-# Print iterations progress
-# taken from (thanks Greenstick):
-# https://stackoverflow.com/questions/3173320/text-progress-bar-in-the-console
-def printProgressBar (iteration, total, prefix = '', suffix = '', decimals = 1, length = 100, fill = '█', printEnd = "\r"):
-    """
-    Call in a loop to create terminal progress bar
-    @params:
-        iteration   - Required  : current iteration (Int)
-        total       - Required  : total iterations (Int)
-        prefix      - Optional  : prefix string (Str)
-        suffix      - Optional  : suffix string (Str)
-        decimals    - Optional  : positive number of decimals in percent complete (Int)
-        length      - Optional  : character length of bar (Int)
-        fill        - Optional  : bar fill character (Str)
-        printEnd    - Optional  : end character (e.g. "\r", "\r\n") (Str)
-    """
-    percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
-    filledLength = int(length * iteration // total)
-    bar = fill * filledLength + '-' * (length - filledLength)
-    print('\r%s |%s| %s%% %s' % (prefix, bar, percent, suffix), end = printEnd)
-    # Print New Line on Complete
-    if iteration == total:
-        print()
+#number of worker processes checking the scenarios of a cyclic subgraph
+#(1 checks them serially on the main solver)
+enumeration_workers=1
+#RCC5 path consistency before calling Z3 on a scenario (see scenarios.py)
+# None: check every scenario with Z3
+# "filter": scenarios that are not path consistent are unsat without calling Z3
+# "closure": path consistency decides sat/unsat without calling Z3
+# "finite_domain": the NumPy finite domain backend decides sat/unsat without calling Z3 (see rcc5_finite_domain.py)
+#the results are the same, the scenarios decided without Z3 are logged without unsat core
+path_consistency=None
+#how the scenarios of a cyclic subgraph are enumerated (see scenarios.py)
+# "product": every scenario of the cartesian product is checked
+# "backtracking": depth-first search that cuts the subtrees of unsat partial scenarios
+# "allsat": enumerates the models of the subgraph (only the sat scenarios are visited; serial only)
+enumeration="product"
+#learn nogoods from the unsat cores and skip the scenarios that contain them
+#(with path_consistency Z3 rarely finds an unsat scenario, thus this is mostly useful without it)
+conflict_learning=False
+#check the scenarios of the product enumeration with pre-built assumption literals
+#instead of building and adding (push/add/pop) a new formula per scenario
+assumption_literals=False
+#seconds between two checkpoints of the enumeration of a cyclic subgraph (see checkpoint.py)
+checkpoint_interval=60
+#assert the rcc5 theory with tracked labels, which makes building it and every check slower.
+#Without tracking (False), each unsat scenario is checked again on a tracked solver (built once
+#per subgraph, when the first unsat scenario is found) to log its unsat core, thus it pays off
+#when Z3 finds few unsat scenarios (e.g. with path_consistency): the results are the same,
+#the unsat cores may differ
+track_theory=True
+#how the checked scenarios of the cyclic subgraphs are logged
+# "jsonl": one record per scenario in <output>/<spec>.scenarios.jsonl (print it with scenario_log.py)
+# "text": their Z3 formula in <output>/<spec>.out (slow to print and huge on big subgraphs)
+scenario_log_format="text"
+#results of the scenarios written in the jsonl log, e.g. ("unsat",) (None logs all of them)
+scenario_log_results=None
+#progress of the long phases (see progress.py): "bar", "silent" or "json" (on stderr, for batch runs)
+progress_mode="bar"
+#reuse the scenarios of isomorphic cyclic subgraphs already analyzed, in this or
+#in a previous run (cached in <output>/subgraph_cache, see subgraph_cache.py):
+#the results are the same, the reused scenarios are not logged again
+subgraph_cache=False
+#reuse the components and regions of the spec package parsed from the same xmi
+#(same bytes) in a previous run (cached in <output>/model_cache, see model_cache.py)
+model_cache=False
+#reuse the results of the cyclic subgraphs (and blocks) that did not change since the last
+#run of the spec package in the same output directory, recorded in <output>/<spec>.manifest.json
+#(see manifest.py): after a small edit of the model only the changed subgraphs are analyzed.
+#The manifest is written by every run, the results are the same
+incremental=False
+#enumerate the biconnected blocks of a cyclic subgraph on their own (see graph_decomposition.py):
+#the risk is the same, but the .out and the scenario log list the scenarios of each block and
+#the report has a cyclic sheet per block (its first row is the all-EQ scenario) with the risk
+#of the subgraph as the product of the blocks
+split_blocks=False
+#count the sat scenarios of the cyclic subgraphs (and the ones with each relation on
+#each pair) on a tree decomposition instead of enumerating them (see rcc5_counting.py).
+#The weights and the risk are exact, but the scenarios are not listed: the report has
+#no cyclic sheets (mitigating a weakness does not change the risk of the subgraphs)
+#and the scenario log and the subgraph cache are not used
+scenario_counting=False
 
 ################################
 # since we unfold the quantifiers we have to calculate
@@ -69,93 +118,41 @@ def printProgressBar (iteration, total, prefix = '', suffix = '', decimals = 1,
 #        
 #    return region_of_subregions
 
-# each region in a pair needs to have
-# a subregion to share and one to keep
-# to be able to use RCC5. This would not
-# be necessary if we didn't unfold quantifiers;
-# but unfolding prevents Z3 from unswering unknown 
-# instead of sat/unsat
-def add_minimal_subregions(pairs,solver):
-    num_subreg=0
-    regions=set()
-    subregions=set()
-    pairs_array=[]
-    for p1,l in pairs.items():
-        for p2 in l:
-            regions.add(p1)
-            pairs_array.append([p1,p2])
-            for i in range(2):
-                s_name="S"+str(p1)+"_"+str(num_subreg)
-                s=Const(s_name,Base)
-                subregions.add(s)
-                solver.assert_and_track(P(s,p1), str("subregion(%s,%s)"%(s,p1)))
-                num_subreg+=1
-
-            regions.add(p2)
-            for i in range(2):
-                s_name="S"+str(p2)+"_"+str(num_subreg)
-                s=Const(s_name,Base)
-                subregions.add(s)
-                solver.assert_and_track(P(s,p2), str("subregion(%s,%s)"%(s,p2)))
-                num_subreg+=1
-    return {'regions':regions,'subregions':subregions,'pairs_array':pairs_array}
-
 ################################
-# add the 5 relation of rcc5 to the solver
+# REGION REGISTRY
+# the regions of the model are created (as constants of the sort Base of the
+# theory, see declare_theory in rcc5_theory.py) with new_region in
+# create_regions_from_xmi and registered by name:
+# registry['regions']={name:{'region':Const,'type':assertion/belief/fact,'owner':component key}}
+# and their assignment to the sets of regions of the components with assign_region
+# index_regions then adds the components having each region (see write_report)
 ################################
-def rcc_five(solver, regions_and_subregions, P, O, EQ, PP, PO, PPi, DR):
-    ################################
-    # OVERLAPS          O(X,Y) : exists Z P(Z, X) /\ P(Z, Y) 
-    # EQUAL             EQ(X,Y) : P(X, Y) /\ P(Y, X) 
-    # DESCRETE FROM     DR(X,Y) : not O(X,Y)
-    # PARTIAL OVERLAP   PO(X,Y) : O(X, Y) /\ (not P(X, Y)) /\ (not P(Y, X))
-    # PROPER PART       PP(X,Y) : P(X, Y) /\ (not P(Y, X)) 
-    # PP INVERSE        PPi(X,Y) : P(Y, X) /\ (not P(X, Y)) 
-    ################################
-    counter=0
-    l=len(regions_and_subregions)
-    tot=l**3
-    for s1 in regions_and_subregions:
-        #solver.add(P(s,s))
-        solver.assert_and_track(P(s1,s1), str("reflexivity(%s1)"%s1))
-        for s2 in regions_and_subregions:
-            #solver.add(Implies(And(P(s1,s2),P(s2,s1)), s1==s2))
-            solver.assert_and_track(Implies(And(P(s1,s2),P(s2,s1)), s1==s2), str("asymmetry(%s,%s)"%(s1,s2)))
-            #solver.add(EQ(s1,s2) == And(P(s1,s2), P(s2,s1)))
-            solver.assert_and_track(EQ(s1,s2) == And(P(s1,s2), P(s2,s1)), str("EQ(%s,%s)"%(s1,s2)))
-            #solver.add(DR(s1,s2) == Not(O(s1,s2)))
-            solver.assert_and_track(DR(s1,s2) == Not(O(s1,s2)), str("DR(%s,%s)"%(s1,s2)))
-            #solver.add(PO(s1,s2) == And(O(s1,s2), Not(P(s1,s2)), Not(P(s2,s1))))
-            solver.assert_and_track(PO(s1,s2) == And(O(s1,s2), Not(P(s1,s2)), Not(P(s2,s1))), str("PO(%s,%s)"%(s1,s2)))
-            #solver.add(PP(s1,s2) == And(P(s1,s2), Not(P(s2,s1))))
-            solver.assert_and_track(PP(s1,s2) == And(P(s1,s2), Not(P(s2,s1))), str("PP(%s,%s)"%(s1,s2)))
-            #solver.add(PPi(s1,s2) == PP(s2, s1)) #  And(P(s2,s1), Not(P(s1,s2))))
-            solver.assert_and_track(PPi(s1,s2) == PP(s2, s1), str("PPi(%s,%s)"%(s1,s2))) #  And(P(s2,s1), Not(P(s1,s2))))
-            array=[]
-            for s3 in regions_and_subregions:
-                #solver.add(Implies(And(P(s1,s2),P(s2,s3)), P(s1,s3)))
-                solver.assert_and_track(Implies(And(P(s1,s2),P(s2,s3)), P(s1,s3)), str("transitivity(%s,%s,%s)"%(s1,s2,s3)))
-                #for OVERLAP
-                array.append(And(P(s3,s1),P(s3,s2)))
-                printProgressBar(counter,tot,decimals=2)
-                counter+=1
-            #solver.add(O(s1,s2) == Or(array)) 
-            solver.assert_and_track(O(s1,s2) == Or(array), str("O(%s,%s) and Z=%s"%(s1,s2,s3))) 
-    
+def new_registry(Base):
+    return {'Base':Base,'regions':{},'roles':{},'order':{},'assignment':[]}
+
+def new_region(registry,name,basetype,owner):
+    region=Const(name,registry['Base'])
+    registry['regions'][name]={'region':region,'type':basetype,'owner':owner}
+    return region
+
+#adds region to the regions of component (with key) as role, and logs it in the
+#registry (registry['assignment']) so that the model can be rebuilt (see model_from_data)
+def assign_region(registry,key,component,role,region):
+    component['regions'][role].add(region)
+    registry['assignment'].append((key,role,str(region)))
+
 #should we create objects with method returning a constant for Z3 of type Base? Maybe... maybe not
-def get_base_type(base):
-    if(str(base).startswith("A")):
-        basetype="assertion"
-    elif(str(base).startswith("B")):
-        basetype="belief"
-    elif(str(base).startswith("F")):
-        basetype="fact"
-    else:
-        basetype="unknown"
-    return basetype
+def get_base_type(base,registry):
+    entry=registry['regions'].get(str(base))
+    if(entry is None):
+        return "unknown"
+    return entry['type']
 
 #input
 # -spec_package: string with the name of the package of the spec
+# -path: the output directory (of the dot file of the model)
+# -Base: the sort of the regions
+# -components_flows: the package already parsed (see get_packages_from_xmi), None parses it
 #output
 # -component_constraints is a dictionary with entries:
 # --components updated with regions (assertions, beliefs, and facts)
@@ -164,8 +161,10 @@ def get_base_type(base):
 # -- defining an equality constraint between the LHS and RHS of each
 #       flow (there is a flow from the out/input port to/from the channel) and
 #       sub-regions of components owned by an agent
-def create_regions_from_xmi(spec_package,xmi_filename):
-    components_flows=get_components_from_xmi(spec_package,xmi=xmi_filename)
+def create_regions_from_xmi(spec_package,xmi_filename,path,Base,components_flows=None):
+    registry=new_registry(Base)
+    if(components_flows is None):
+        components_flows=get_components_from_xmi(spec_package,xmi=xmi_filename)
     create_model_dot(path, spec_package, components_flows['components'], components_flows['flows'])
     components=components_flows['components']
     flows=components_flows['flows']
@@ -196,12 +195,12 @@ def create_regions_from_xmi(spec_package,xmi_filename):
             cv['regions']['output']=set()#Const("B"+str(region_id),Base)
         elif(cv['type']=="channel"):
             cv['regions']={}
-            cv['regions']['input']=Const("A"+str(region_id),Base)
+            cv['regions']['input']=new_region(registry,"A"+str(region_id),"assertion",ck)
             region_id+=1
-            cv['regions']['output']=Const("A"+str(region_id),Base)
+            cv['regions']['output']=new_region(registry,"A"+str(region_id),"assertion",ck)
         elif(cv['type']=="base"):
             cv['regions']={}
-            cv['regions']['belief']=Const("B"+str(region_id),Base)
+            cv['regions']['belief']=new_region(registry,"B"+str(region_id),"belief",ck)
         else:
             continue
         region_id+=1
@@ -214,23 +213,23 @@ def create_regions_from_xmi(spec_package,xmi_filename):
         tmp_belief=None
         for r in fv: #fk->r is a flow
             if(components[fk]['type']=="outputport" and components[r]['type']=="channel"):
-                components[fk]['regions']['output'].add(components[r]['regions']['input'])
+                assign_region(registry,fk,components[fk],'output',components[r]['regions']['input'])
                 if(len(fv)>1):
                     print("ERROR cannot have multiple flows from port %s to channel"%components[fk]['name'])
             elif(components[fk]['type']=="channel" and components[r]['type']=="inputport"):
-                components[r]['regions']['input'].add(components[fk]['regions']['output'])
+                assign_region(registry,r,components[r],'input',components[fk]['regions']['output'])
                 if(len(fv)>1):
                     print("ERROR cannot have multiple flows from channel %s to port"%components[fk]['name'])
             elif((components[fk]['type']=="funblock" or components[fk]['type']=="inputsocket" or components[fk]['type']=="outputsocket" or components[fk]['type']=="inputport") and (components[r]['type']=="funblock" or components[r]['type']=="outputsocket" or components[r]['type']=="inputsocket" or components[r]['type']=="outputport" or components[r]['type']=="inputport")):
                 if(tmp_belief is None):
-                    tmp_belief=Const("B"+str(region_id),Base)
+                    tmp_belief=new_region(registry,"B"+str(region_id),"belief",fk)
                     region_id+=1
-                components[fk]['regions']['output'].add(tmp_belief)
-                components[r]['regions']['input'].add(tmp_belief)
+                assign_region(registry,fk,components[fk],'output',tmp_belief)
+                assign_region(registry,r,components[r],'input',tmp_belief)
             elif(components[fk]['type']=="base"):
-                components[r]['regions']['input'].add(components[fk]['regions']['belief'])
+                assign_region(registry,r,components[r],'input',components[fk]['regions']['belief'])
             elif(components[r]['type']=="base"):
-                components[fk]['regions']['input'].add(components[r]['regions']['belief'])
+                assign_region(registry,fk,components[fk],'input',components[r]['regions']['belief'])
             else:
                 print("ERROR in parsing data-flow structure")
                 print("%s[%s] -> %s[%s] not supported"%(components[fk]['name'],components[fk]['type'],components[r]['name'],components[r]['type']))
@@ -243,41 +242,87 @@ def create_regions_from_xmi(spec_package,xmi_filename):
     #each region has a corresponding fact (which may be dr or eq)
     for cv in components.values():
         if(cv['type']=="base"):
-            common_knowledge['regions']['fact'].add(Const("F_"+str(cv['regions']['belief']),Base))
+            assign_region(registry,"root",common_knowledge,'fact',new_region(registry,"F_"+str(cv['regions']['belief']),"fact","root"))
             if(cv['owner']!="root"):
-                components[cv['owner']]['regions']['belief'].add(cv['regions']['belief'])
+                assign_region(registry,cv['owner'],components[cv['owner']],'belief',cv['regions']['belief'])
         elif(cv['type']=="funblock" or cv['type']=="inputsocket" or cv['type']=="outputsocket"):
             for o in cv['regions']['output']:
-                common_knowledge['regions']['fact'].add(Const("F_"+str(o),Base))
+                assign_region(registry,"root",common_knowledge,'fact',new_region(registry,"F_"+str(o),"fact","root"))
             if(cv['owner']!="root"):
                 for i in cv['regions']['input']:
-                    components[cv['owner']]['regions'][get_base_type(i)].add(i)
+                    assign_region(registry,cv['owner'],components[cv['owner']],get_base_type(i,registry),i)
                 for o in cv['regions']['output']:
-                    components[cv['owner']]['regions'][get_base_type(o)].add(o)
+                    assign_region(registry,cv['owner'],components[cv['owner']],get_base_type(o,registry),o)
         elif(cv['type']=="inputport" or cv['type']=="outputport"):
             if(cv['owner']!="root"):
                 for i in cv['regions']['input']:
-                    components[cv['owner']]['regions'][get_base_type(i)].add(i)
+                    assign_region(registry,cv['owner'],components[cv['owner']],get_base_type(i,registry),i)
                 for o in cv['regions']['output']:
-                    components[cv['owner']]['regions'][get_base_type(o)].add(o)
+                    assign_region(registry,cv['owner'],components[cv['owner']],get_base_type(o,registry),o)
     components['root']=common_knowledge
-    return components
-
-def get_base_by_name(name,components):
-    for c in components.values():
-        if(name.startswith("A") or name.startswith("B")):
-            if(c['type']=="agent"):
-                for r in c['regions']['assertion']:
-                    if(name==str(r)):
-                        return r
-                for r in c['regions']['belief']:
-                    if(name==str(r)):
-                        return r
-        elif(name.startswith("F")):
-            if(c['type']=="root"):
-                for r in c['regions']['fact']:
-                    if(name==str(r)):
-                        return r
+    index_regions(components,registry)
+    return {'components':components,'flows':flows,'registry':registry,'stats':components_flows['stats']}
+
+#the output of create_regions_from_xmi as plain data (see model_cache.py): the regions
+#are replaced by their names and the sets of regions are rebuilt by replaying their
+#assignment, so that the sets (and the graph, the subgraphs, ...) iterate in the same order
+def model_to_data(model):
+    components={}
+    for k,v in model['components'].items():
+        components[k]={k2:v2 for k2,v2 in v.items() if k2!='regions'}
+        if('regions' in v):
+            components[k]['regions']={role:None if isinstance(regions,set) else str(regions) for role,regions in v['regions'].items()}
+    registry=model['registry']
+    regions=[[name,entry['type'],entry['owner']] for name,entry in registry['regions'].items()]
+    return {'components':components,'flows':model['flows'],'regions':regions,'assignment':registry['assignment']}
+
+def model_from_data(data,Base):
+    registry=new_registry(Base)
+    for name,basetype,owner in data['regions']:
+        new_region(registry,name,basetype,owner)
+    regions=registry['regions']
+    components={}
+    for k,v in data['components'].items():
+        components[k]={k2:v2 for k2,v2 in v.items() if k2!='regions'}
+        if('regions' in v):
+            components[k]['regions']={role:set() if name is None else regions[name]['region'] for role,name in v['regions'].items()}
+    for key,role,name in data['assignment']:
+        assign_region(registry,key,components[key],role,regions[name]['region'])
+    index_regions(components,registry)
+    return {'components':components,'flows':data['flows'],'registry':registry}
+
+#reverse index of the regions of the components (built once by create_regions_from_xmi)
+# registry['roles']={name:{role:[component key, ...]}} where role is the key
+#   of the region in the regions of the component (input, output, belief, assertion, fact)
+#   and the components are in the order of components
+# registry['order']={component key: position in components}
+def index_regions(components,registry):
+    for k,v in components.items():
+        registry['order'][k]=len(registry['order'])
+        for role,regions in v.get('regions',{}).items():
+            if(not isinstance(regions,set)):
+                regions={regions}
+            for r in regions:
+                roles=registry['roles'].setdefault(str(r),{})
+                roles.setdefault(role,[]).append(k)
+
+#components (of one of types) having region as role, in the order of components
+def components_with_region(registry,components,region,role,types):
+    return [k for k in registry['roles'].get(str(region),{}).get(role,[]) if components[k]['type'] in types]
+
+#the last component in the order of components (as a scan of components would find it)
+def last_component(registry,keys):
+    return max(keys,key=lambda k:registry['order'][k]) if keys else None
+
+#the assertion or belief of an agent, or the fact, named name (None if there isn't one)
+def get_base_by_name(name,components,registry):
+    owners=registry['roles'].get(name,{})
+    if(name.startswith("A") or name.startswith("B")):
+        if(any(components[k]['type']=="agent" for k in owners.get('assertion',[])+owners.get('belief',[]))):
+            return registry['regions'][name]['region']
+    elif(name.startswith("F")):
+        if(any(components[k]['type']=="root" for k in owners.get('fact',[]))):
+            return registry['regions'][name]['region']
     return None
 
 #generates all the possible pairs of regions 
@@ -290,7 +335,7 @@ def get_base_by_name(name,components):
 # - pair relation (A,B), (B,F), or (A,F) [red/green/blue no-arrow]
 # and the following nodes:
 # - F:facts, B:beliefs, A:assertions, name:agents
-def generate_graph(components):
+def generate_graph(path,spec_package,components,registry):
 
     f=open(os.path.join(path,spec_package+"_graph.dot"),"w+")
     f.write("digraph G {\n")
@@ -302,12 +347,13 @@ def generate_graph(components):
             for fact in c['regions']['fact']:
                 f.write("%s -> %s [style=dotted]\n"%("root",str(fact)))
                 f.write("%s -> %s [arrowhead=none, penwidth=2, label=BF, color=\"green\"]\n"%(str(fact),str(fact)[2:]))
+                belief=get_base_by_name(str(fact)[2:],components,registry)
                 if(fact in pairs):
-                    pairs[fact].append(get_base_by_name(str(fact)[2:],components))
-                elif(get_base_by_name(str(fact)[2:],components) in pairs):
-                    pairs[get_base_by_name(str(fact)[2:],components)].append(fact)
+                    pairs[fact].append(belief)
+                elif(belief in pairs):
+                    pairs[belief].append(fact)
                 else:
-                    pairs[fact]=[get_base_by_name(str(fact)[2:],components)]
+                    pairs[fact]=[belief]
                 num_pairs+=1
         elif(c['type']=="agent"):
             for r in c['regions']['assertion']:
@@ -347,7 +393,9 @@ def generate_graph(components):
     f.close()
     return {'pairs':pairs,'num_pairs':num_pairs}
 
-def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components):
+#writes <path>/<spec_package>_securityAssessment.xlsx and returns the total risk with
+#all the weaknesses open (the RISK of the Risk sheet, the product of its column C)
+def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components,registry):
     workbook = xlsxwriter.Workbook(os.path.join(path,spec_package+"_securityAssessment.xlsx"))
     relation2row = {}
     #ARCHITECTURE (HW/SW requirements) sheet
@@ -406,54 +454,45 @@ def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components)
         for pair,weight in pairs_weight.items():
             left=pair[0]
             right=pair[1]
-            left_type=get_base_type(pair[0])
-            right_type=get_base_type(pair[1])
+            left_type=get_base_type(pair[0],registry)
+            right_type=get_base_type(pair[1],registry)
             weakness={'component':None,'input':None,'relation':rel,'semantics':None,'agent':None}
 
+            #the owner of the pair is looked up in the registry; when more components
+            #match, the last one (in the order of components) is the owner
             if((left_type=="belief" and right_type=="assertion") or (right_type=="belief" and left_type=="assertion")): #ab
-                for k,v in components.items():
-                    if(v['type'] in {"inputport","outputport"}):
-                        for i in v['regions']['input']:
-                            for o in v['regions']['output']:
-                                if((i==left and o==right) or (i==right and o==left)):
-                                    weakness['component']=k
-                                    weakness['relation']=rel
-                                    weakness['semantics']="weak_port"
-                                    break
+                ports={"inputport","outputport"}
+                owners=set(components_with_region(registry,components,left,'input',ports)) & set(components_with_region(registry,components,right,'output',ports))
+                owners|=set(components_with_region(registry,components,right,'input',ports)) & set(components_with_region(registry,components,left,'output',ports))
+                if(owners):
+                    weakness['component']=last_component(registry,owners)
+                    weakness['relation']=rel
+                    weakness['semantics']="weak_port"
 
             elif((left_type=="belief" and right_type=="fact") or (right_type=="belief" and left_type=="fact")): #bf
-                comp_tmp=None
-                out_comp=False
-                input_tmp=None
-                for k,v in components.items():
-                    if(v['type'] in {"inputsocket","outputsocket","funblock"}):
-                        for o in v['regions']['output']:
-                            if((left_type=="belief" and o==left) or (right_type=="belief" and o==right)):
-                                out_comp=True
-                                weakness['component']=k
-                                weakness['relation']=rel
-                                weakness['semantics']="weak_out_block"
-                                break
-                        for i in v['regions']['input']:
-                            if((left_type=="belief" and i==left) or (right_type=="belief" and i==right)):
-                                comp_tmp=k
-                                input_tmp=i
-                if(not out_comp):
-                    for c in components.values():
-                        if(c['type']=="base" and c['regions']['belief']==input_tmp):
-                            weakness['input']=c['name']
-                            break
+                belief=left if left_type=="belief" else right
+                blocks={"inputsocket","outputsocket","funblock"}
+                out_comp=last_component(registry,components_with_region(registry,components,belief,'output',blocks))
+                if(out_comp is not None):
+                    weakness['component']=out_comp
+                    weakness['relation']=rel
+                    weakness['semantics']="weak_out_block"
+                else:
+                    comp_tmp=last_component(registry,components_with_region(registry,components,belief,'input',blocks))
+                    bases=components_with_region(registry,components,belief,'belief',{"base"}) if comp_tmp is not None else []
+                    if(bases):
+                        weakness['input']=components[bases[0]]['name']
                     weakness['component']=comp_tmp
                     weakness['relation']=rel
                     weakness['semantics']="weak_in_block"
 
             elif(left_type=="assertion" and right_type=="assertion"): #aa
-                for k,v in components.items():
-                    if(v['type'] == "channel"):
-                        if((v['regions']['input']==left and v['regions']['output']==right) or (v['regions']['input']==right and v['regions']['output']==left)):
-                            weakness['component']=k
-                            weakness['relation']=rel
-                            weakness['semantics']="weak_channel"
+                owners=set(components_with_region(registry,components,left,'input',{"channel"})) & set(components_with_region(registry,components,right,'output',{"channel"}))
+                owners|=set(components_with_region(registry,components,right,'input',{"channel"})) & set(components_with_region(registry,components,left,'output',{"channel"}))
+                if(owners):
+                    weakness['component']=last_component(registry,owners)
+                    weakness['relation']=rel
+                    weakness['semantics']="weak_channel"
 
             owner_tmp=None
             requirement=weakness.get('component')
@@ -524,9 +563,11 @@ def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components)
         risk_sheet.write_string(0, i, first_row[i], cell_format['first_risk']) 
 
     risk_id=1
+    risks=[]
     for k,v in risk_sheet_struct.items():
         risk_sheet.write(risk_id, 0, k, cell_format['all_risk'])
         for relation in v.values():
+            risks.append(len(relation))
             relation_count=0
             for i in relation:
                 risk_sheet.write_formula(risk_id, 1, i)
@@ -535,26 +576,58 @@ def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components)
             sum_in_if_tmp="SUM(B"+str(risk_id-(relation_count-1))+":B"+str(risk_id)+")"
             risk_sheet.write(risk_id-1,2,"=IF("+sum_in_if_tmp+"=0,\"\","+sum_in_if_tmp+")")
 
+    #the blocks of a subgraph (see record_insecure_scenarios) have a sheet each, and
+    #a row in the risk sheet with the product of their sums minus the secure scenario.
+    #Counted subgraphs (see record_scenario_counts) have no sheet, their row has their count
+    num_blocks={}
+    for subgraph in cyclic_risk_struct.values():
+        if('block_of' in subgraph):
+            num_blocks[subgraph['block_of']]=num_blocks.get(subgraph['block_of'],0)+1
+    block_sums=[]
+    block_risks=[]
     cyclic_sheet_id=0
+    counted_id=0
     for subgraph in cyclic_risk_struct.values():
-        cyclic_struct_sheet=workbook.add_worksheet("cyclic_"+str(cyclic_sheet_id))
-        row=0
-        for relations in subgraph:
-            col=0
-            for rel in relations:
-                if(str(rel).lower() in relation2row.keys()):
-                    #If status is mitigated 0, 1 oth.
-                    cyclic_struct_sheet.write(row,col,"=IF('"+weak_sheet_name+"'!H"+str(relation2row[str(rel).lower()])+"=\"mitigated\", 0, 1)")
-                else:
-                    cyclic_struct_sheet.write(row,col,1)
-                col+=1
-            cyclic_struct_sheet.write_formula(row,col+1,"=PRODUCT(A"+str(row+1)+":"+chr(65+col)+str(row+1)+")")
-            row+=1
+        if('count' in subgraph):
+            name,sheet_id="counted_",counted_id
+            subgraph_sum=str(subgraph['count'])
+            subgraph_risk=subgraph['count']
+            counted_id+=1
+        else:
+            cyclic_struct_sheet=workbook.add_worksheet("cyclic_"+str(cyclic_sheet_id))
+            row=0
+            #the scenarios are decoded one at a time (see record_insecure_scenarios)
+            for relations in cyclic_scenario_relations(subgraph):
+                col=0
+                for rel in relations:
+                    if(rel.lower() in relation2row.keys()):
+                        #If status is mitigated 0, 1 oth.
+                        cyclic_struct_sheet.write(row,col,"=IF('"+weak_sheet_name+"'!H"+str(relation2row[rel.lower()])+"=\"mitigated\", 0, 1)")
+                    else:
+                        cyclic_struct_sheet.write(row,col,1)
+                    col+=1
+                cyclic_struct_sheet.write_formula(row,col+1,"=PRODUCT(A"+str(row+1)+":"+chr(65+col)+str(row+1)+")")
+                row+=1
+            name,sheet_id="cyclic_",cyclic_sheet_id
+            subgraph_sum="SUM('cyclic_"+str(cyclic_sheet_id)+"'!"+chr(65+col+1)+":"+chr(65+col+1)+")"
+            subgraph_risk=row
+            #=SUM($cyclic_0.G:G)
+            cyclic_sheet_id+=1
+        if('block_of' in subgraph):
+            block_sums.append(subgraph_sum)
+            block_risks.append(subgraph_risk)
+            if(len(block_sums)==num_blocks[subgraph['block_of']]):
+                risk_id+=1
+                risk_sheet.write(risk_id-1,0,name+str(sheet_id-len(block_sums)+1)+"-"+str(sheet_id))
+                risk_sheet.write(risk_id-1,2,"=PRODUCT("+",".join(block_sums)+")-1")
+                risks.append(math.prod(block_risks)-1)
+                block_sums=[]
+                block_risks=[]
+            continue
         risk_id+=1
-        risk_sheet.write(risk_id-1,0,"cyclic_"+str(cyclic_sheet_id))
-        risk_sheet.write(risk_id-1,2,"=SUM('cyclic_"+str(cyclic_sheet_id)+"'!"+chr(65+col+1)+":"+chr(65+col+1)+")")
-        #=SUM($cyclic_0.G:G)
-        cyclic_sheet_id+=1
+        risk_sheet.write(risk_id-1,0,name+str(sheet_id))
+        risk_sheet.write(risk_id-1,2,"="+subgraph_sum)
+        risks.append(subgraph_risk)
 
     risk_id+=1
     risk_sheet.write(risk_id+1, 0, "RISK", cell_format['first_risk'])
@@ -562,308 +635,395 @@ def write_report(path,spec_package,risk_structure,cyclic_risk_struct,components)
     risk_sheet.write(risk_id+2, 0, "The total risk is the total number of insecure configurations of the system", cell_format['all_risk'])
 
     workbook.close()
+    #PRODUCT of no values is 0
+    return math.prod(risks) if risks else 0
 
-path = os.path.join("./","output_secra")
-if not os.path.exists(path):
-    os.mkdir(path)
-
-solver=Solver()
-z3.set_param('parallel.enable', True)
-z3.set_param('parallel.threads.max', 32)
-#Z3 doesn't (nor any other SMT solver) support sub-sorting
-#https://stackoverflow.com/questions/36933174/sort-inheritance-in-z3
-#this may be of interest:
-#https://stackoverflow.com/questions/12253088/how-to-check-if-a-const-in-z3-is-a-variable-or-a-value
-Base = DeclareSort('Base')
-
-P  = Function('P', Base, Base, BoolSort())
-O  = Function('O', Base, Base, BoolSort())
-EQ = Function('EQ', Base, Base, BoolSort())
-DR = Function('DR', Base, Base, BoolSort())
-PO = Function('PO', Base, Base, BoolSort())
-PP = Function('PP', Base, Base, BoolSort())
-PPi= Function('PPi', Base, Base, BoolSort())
+################################
+# ANALYSIS
+# analyze runs the whole analysis of spec_package in xmi_filename and writes
+# its outputs in path. The options are the configuration variables above
+# (default_options), e.g. to count the scenarios of TwoGuysTalking:
+#   results=analyze("Engineering.xmi","TwoGuysTalking","output_secra",{'scenario_counting':True})
+# Importing secra.py has no side effects, the script (python3 secra.py) runs the
+# analysis of spec_package in xmi_filename and writes its outputs in ./output_secra
+################################
+def default_options():
+    return {'enumeration_workers':enumeration_workers,'path_consistency':path_consistency,'enumeration':enumeration,
+        'conflict_learning':conflict_learning,'assumption_literals':assumption_literals,'checkpoint_interval':checkpoint_interval,
+        'track_theory':track_theory,'scenario_log_format':scenario_log_format,'scenario_log_results':scenario_log_results,
+        'subgraph_cache':subgraph_cache,'model_cache':model_cache,'incremental':incremental,'split_blocks':split_blocks,'scenario_counting':scenario_counting}
 
 # create list of unique regions (and subregions) of the spec
 # as a (time) speedup this can be an output of create_regions_from_xmi()
-print("1. Parse package %s in %s and calculate Bases"%(spec_package,xmi_filename))
-components=create_regions_from_xmi(spec_package,xmi_filename)
-#TODO generate a json  
-f=open(os.path.join(path,spec_package+"_model.out"),"w+")
-pprint.pprint(components,f)
-f.close()
-
-print("2. Calculate pairs and generate graph")
-pairs_num=generate_graph(components)
-
-print("3. Analyze graph")
-f=open(os.path.join(path,spec_package+".out"),"w+")
-f.write("spec: %s\n"%spec_package)
-f.write("pairs of regions: %s\n"%str(pairs_num['num_pairs']))
-
-#decompose in disconnected subgraph
-#and extract cycles
-#implement a DFS and detect all disconnected subgraph
-#and per each one detect if they contain cycles
-
-#DEBUG the following code is just to test cycles -- remove code below
-#pair_to_add=[]
-#print(pairs_num['pairs'])
-#for k in pairs_num['pairs'].keys():
-#    if(str(k)=="B31" or str(k)=="A23"):# or str(k)=="F_B21"):
-#        pair_to_add.append(k)
-#
-#print(pair_to_add)
-#pairs_num['pairs'][pair_to_add[0]].append(pair_to_add[1])
-##pairs_num['pairs'][pair_to_add[0]].append(pair_to_add[2])
-#print("****(DEBUG) MODIFIED STRUCTURE TO DEBUG CYCLE-FUN")
-# DEBUG REMOVE code above
-
-# the data structure (pairs_num['pairs']) is a 
-# list of pairs implemented as an adjacence list of a directed graph
-# but contains either [A,[B]] or [B[A]], not both 
-found=[]
-connected_nodes=[]
-stack=[]
-subgraphs={}
-subgraphs['acycle']=[]
-subgraphs['cycle']=[]
-for n,adj in pairs_num['pairs'].items():
-    # we should use a deque for performance
-    # https://realpython.com/how-to-implement-python-stack/
-    if(len(stack)!=0):
-        print("ERROR")
-        sys.exit(0)
-    if(n not in found):
-        stack.append(n)
-    else:
-        continue
-    #print("n:",n)
-    #print("stack:",stack)
-    #print("found:",found)
-    #print()
-    cycle=False
-    while(len(stack) != 0):
-        current=stack.pop()
-        if(current not in found):
-            found.append(current)
-        if(current not in connected_nodes):
-            connected_nodes.append(current)
-        else: 
-            #print("cycle",current)
-            #print(connected_nodes)
-            cycle=True
-
-        if(current in pairs_num['pairs'].keys()):
-            for adj_node in pairs_num['pairs'][current]:
-                stack.append(adj_node)
-        
-        #print("current:",current)
-        #print("stack:",stack)
-        #print("found:",found)
-        #print()
-
-    #print("cn ",connected_nodes)
-    #we here save only the nodes but we reconstruct the
-    # subgraph containing the nodes during the analysis
-    if(cycle):
-        subgraphs['cycle'].append(connected_nodes)
+def load_model(xmi_filename,spec_package,path,Base,use_cache=True,components_flows=None):
+    model=None
+    if(use_cache):
+        model_cache_dir=os.path.join(path,"model_cache")
+        model_key=model_cache_key(xmi_filename,spec_package)
+        start=time.time()
+        data=lookup_model(model_cache_dir,model_key)
+        if(data is not None):
+            model=model_from_data(data,Base)
+            create_model_dot(path, spec_package, {k:v for k,v in model['components'].items() if k!="root"}, model['flows'])
+            print("   loaded from the model cache in %.3fs"%(time.time()-start))
+    if(model is None):
+        model=create_regions_from_xmi(spec_package,xmi_filename,path,Base,components_flows)
+        print("   parsed in %.3fs"%model['stats']['parse_time'])
+        if(use_cache):
+            store_model(model_cache_dir,model_key,model_to_data(model))
+    return model
+
+#the solver of (a block of) a cyclic subgraph with its subregions and, once asserted by
+#analyze_block, the rcc5 theory: {'solver','regions_subregions_pairs','theory':asserted}.
+#The blocks of a subgraph share their cut regions, whose subregions are named with suffix
+#(see add_minimal_subregions). Without analysis['solvers'] they are asserted in a scope of
+#the solver of the analysis (removed by analyze_block), otherwise each block has its own
+#solver kept in analysis['solvers'] (at most PREPARED_SOLVERS, the oldest are dropped)
+#for the next analyses of the process with the same pairs
+def prepare_block_solver(analysis, sub_pairs_num, suffix):
+    theory=analysis['theory']
+    track_theory=analysis['options']['track_theory']
+    solvers=analysis['solvers']
+    key=(str(sub_pairs_num),suffix,track_theory)
+    #a solver left in a scope by an interrupted analysis is prepared again
+    if(solvers is not None and key in solvers and solvers[key]['solver'].num_scopes()==0):
+        print("Constraints on regions reused from a previous analysis")
+        return solvers[key]
+    if(solvers is None):
+        solver=analysis['solver']
+        solver.push()
     else:
-        subgraphs['acycle'].append(connected_nodes)
-    connected_nodes=[]
-counter=0
-#risk_structure{ relation:{pair:weight} }
-risk_structure={'po':{},'pp':{},'ppi':{},'dr':{}}
-
-#suppose rcc5
-# Cyclic and acyclic sub-graphs CG_1,...,CG_n,AG_1,...,AG_n do not affect each others.
-# We can see them as independet parts of a combination. If each sub-graph had only 5 configurations
-# representing a sub-part of a scenario, the number of possible scenarios would be 5^{#sub-graphs}=5^{2n}.
-# When a subgraph is removed, to calculate the new number of possible scenarios 1 needs to be
-# removed at the exponent (e.g. removing 1 sub-graph results in 5^{2n-1}.
-# If each acyclic sub-graph has M relations of arity 5, those relations are independent (do not affect each other)
-# therefore, the number of combination 5^M. With N acyclic sub-graphs, each with M relations with arity 5 we have
-# 5^M^N=5^{M*N} scenarios; removing 1 relation would result in 5^{(M*N)-1} scenarios
-
-if(subgraphs['acycle']!=[]):
-    print("FOUND %d SIMPLE (ACYCLICAL) STRUCTURE(S)"%len(subgraphs['acycle']))
-
-for s in subgraphs['acycle']:
-    subgraph_id=str(s)
-    f.write("\nSIMPLE ACYCLIC SUBGRAPHS (Any relation in RCC5 holds and do not affect the rest of the model)\n")
-
-    # suppose node1 -- node2 -- node3 represented as [node1 node2 node3]
-    # if the number of insecurity relations between 2 nodes are 4 we have
-    # 4*4=4^2 combinations/configurations. If I mitigate one of the relations 
-    # I have 3*4 combinations; so, (1+1+1+1)*(1+1+1+1) becomes (0+1+1+1)*(1+1+1+1)
-    # and that mitigation reduces by 1*(1+1+1+1)=1*4=4
-    # If we have 4 nodes, we have 4*4*4 combinations; mitigating one results in
-    # 3*4*4 so we reduced by 1*4*4. This is not a proof but an example to show that
-    # the mitigation weight is proportional to the number of relations. 
-    # Therefore, the weight (of mitigating a relation) is 
-    # weight = 1 * (insecurity_relations ** (total_num_of_relations_in_graph-1)) [in Python **=^]
-    # the number of relation can only be calculated after the following cycle (i.e. s only contains nodes, not the relations between them)
-    num_of_relations=0
-    tmp_risk_structure={'po':{},'pp':{},'ppi':{},'dr':{}}
-    for node in s:
-        if(node in pairs_num['pairs'].keys()):
-            f.write("%d [%s,%s]\n"%(counter, str(node), str(pairs_num['pairs'][node])))
-            for i in pairs_num['pairs'][node]:
-                num_of_relations+=1
-                tmp_risk_structure['po'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}}
-                tmp_risk_structure['pp'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
-                tmp_risk_structure['ppi'][(node,i)] = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
-                tmp_risk_structure['dr'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
-    for k,v in tmp_risk_structure.items():
-        for k1,v1 in v.items():
-            risk_structure[k][k1]=tmp_risk_structure[k][k1]
-            risk_structure[k][k1]['direct_weight']=(INSECURITY_CONFIGURATIONS**(num_of_relations-1))
-            risk_structure[k][k1]['indirect_weight']['tot_config']=(INSECURITY_CONFIGURATIONS**num_of_relations)
-
-    counter+=1
-
-print("Analysis on simple structures concluded and reported\n")
-
-#in the case of cyclical structures we need to calculate the number of scenarios in which
-# a relation appears
-
-if(subgraphs['cycle']!=[]):
-    print("FOUND %d COMPLEX (CYCLICAL) STRUCTURE(S)\n"%len(subgraphs['cycle']))
-    f.write("\nCYCLYC SUBGRAPHS\n")
-
-#in cyclic_risk_struct we explicitly save all the possible
-# configurations of the cyclic subgraphs
-# cyclic_risk_struct={subgraph_1 : [ [eq(a,b), eq(b,c), ...] ... [...]]}
-cyclic_risk_struct={}
-
-cyclic_struct_counter=1
-for s in subgraphs['cycle']:
-    subgraph_id=str(s)
-    cyclic_risk_struct[subgraph_id]=[]
-
-    total_insecure_configurations=0
-    f.write("Analyze structure %d\n"%cyclic_struct_counter)
-    print("Analyze structure %d\n"%cyclic_struct_counter)
-
-    sub_pairs_num={}
-    for node in s:
-        if(node in pairs_num['pairs'].keys()):
-            sub_pairs_num[node]=pairs_num['pairs'][node]
-
+        solver=Solver()
     print("Add constraints on regions (for the unfolding of quantifiers)")
-    regions_subregions_pairs=add_minimal_subregions(sub_pairs_num,solver)
-    
-    # add topology theory to solver
-    print("Create Topological structure, RCC5 Theory + unfolding quantifiers")
-    rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), P, O, EQ, PP, PO, PPi, DR)
-    print()
-    
-    #create a list of rcc5 relation per each pair of regions
-    rcc5=[EQ,PP,PPi,PO,DR]
-    itertables = []
+    prepared={'solver':solver,'regions_subregions_pairs':add_minimal_subregions(sub_pairs_num,solver,theory['Base'],theory['P'],track_theory,suffix),'theory':False}
+    if(solvers is not None):
+        if(len(solvers)>=PREPARED_SOLVERS):
+            del solvers[next(iter(solvers))]
+        solvers[key]=prepared
+    return prepared
+
+#enumerates the scenarios of (a block of) a cyclic subgraph and writes its statistics
+#analysis has the state of the analysis of the cyclic subgraphs (see analyze)
+def analyze_block(analysis, subgraph_id, sub_pairs_num, suffix=""):
+    options=analysis['options']
+    theory=analysis['theory']
+    f=analysis['f']
+    track_theory=options['track_theory']
+    prepared=prepare_block_solver(analysis, sub_pairs_num, suffix)
+    solver=prepared['solver']
+    regions_subregions_pairs=prepared['regions_subregions_pairs']
     pairs_array=regions_subregions_pairs['pairs_array']
-    for i in pairs_array:
-        itertables.append(rcc5)
-    
-    counter=1
-    counter_sat=0
-    counter_unsat=0
-    counter_unknown=0
-    
-    num_pairs=0
-    for v in sub_pairs_num.values():
-        num_pairs+=len(v)
-    num_scenarios=RCC_CONFIGURATIONS**len(itertables)
+
+    num_scenarios=RCC_CONFIGURATIONS**len(pairs_array)
     f.write("possible scenarios: %s\n\n"%str(num_scenarios))
-    #itertools creates the cartesian product on the vector of rcc5 relations
-    #total_scenarios=len(list(itertools.product(*itertables)))
-    avg_time=0.00000
-    sum_time=0.00000
-    
-    # TODO save pairs and restart from that iteration
-    # https://stackoverflow.com/questions/36802314/python-itertools-product-start-from-certain
-    for t in itertools.product(*itertables):
-        start = time.time()
-    
-        sec_avg=str(avg_time).split('.')[0]
-        dec_avg=str(avg_time).split('.')[1]
-        sec_sum=str(sum_time).split('.')[0]
-        dec_sum=str(sum_time).split('.')[1]
-        end=avg_time*(num_scenarios-counter)
-        end_estimation=str(end).split('.')[0]
-        printProgressBar(counter,num_scenarios,suffix="avg:"+sec_avg+"."+dec_avg[:5]+"s tot:"+sec_sum+"."+dec_sum[:2]+"s"+" end:"+end_estimation+"s",decimals=5)
-        array_scenario=[]
-
-        risk_tmp=[]
-        for i in range(len(t)):
-            array_scenario.append(t[i](pairs_array[i]))
-            if(t[i]!=EQ):
-                risk_tmp.append([str(t[i]).lower(),pairs_array[i]])
-
-        scenario=And(array_scenario)
-    
-        solver.push()
-        solver.add(scenario)
-        check=solver.check()
-    
-        if(check == unsat):
-            counter_unsat+=1
-            f.write("UNSAT CORE\n")
-            core=solver.unsat_core()
-            for k in core:
-                f.write('%s=%s\n'%(k, core[k]))
-        if(check == unknown):
-            counter_unknown+=1
-        if(check == sat):
-            counter_sat+=1
-
-            if(risk_tmp != []):
-                total_insecure_configurations+=1
-                cyclic_risk_struct[subgraph_id].append(array_scenario)
-
-                for r1 in risk_tmp:
-                    if(tuple(r1[1]) not in risk_structure[r1[0]]):
-                        risk_structure[r1[0]][tuple(r1[1])]={}
-                        risk_structure[r1[0]][tuple(r1[1])]['direct_weight']=0
-                        risk_structure[r1[0]][tuple(r1[1])]['type']="cyclic"
-                        risk_structure[r1[0]][tuple(r1[1])]['indirect_weight']={'subgraph':subgraph_id}
-                    risk_structure[r1[0]][tuple(r1[1])]['direct_weight']+=1
-                for r2 in risk_tmp:
-                    if(r1[1] != r2[1]):
-                        if(tuple(r2[1]) not in risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'].keys()):
-                            risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'][tuple(r2[1])]={'dr':0,'pp':0,'ppi':0,'po':0}
-                        risk_structure[r1[0]][tuple(r1[1])]['indirect_weight'][tuple(r2[1])][r2[0]]+=1
-
-
-            #f.write("MODEL\n")
-            #model=solver.model()
-            #for k in model:
-            #    f.write('%s=%s\n'%(k, model[k]))
-    
-        #TODO 
-        #https://stackoverflow.com/questions/14628279/z3-convert-z3py-expression-to-smt-lib2/14629021#14629021
-        #https://stackoverflow.com/questions/19569431/z3py-print-large-formula-with-144-variables
-        f.write("%d %s\n %s\n\n"%(counter, check, str(scenario).replace('\n','')))
 
+    #isomorphic subgraphs (same shape, any region names) have the same scenarios (see subgraph_cache.py)
+    form=canonical_form(pairs_array)
+    mode="counting" if options['scenario_counting'] else "enumeration"
+    #subgraphs analyzed by the last run (see manifest.py)
+    reuse,reused=reuse_subgraph(analysis['previous_manifest'], subgraph_id, pairs_array, form, mode) if options['incremental'] else (None,None)
+    cached=lookup_subgraph(analysis['cache_dir'], form, analysis['cache_memory']) if reused is None and options['subgraph_cache'] and not options['scenario_counting'] else None
+    if(reused is not None):
+        print("Subgraph %s since the last run, results reused from the manifest"%reuse)
+        f.write("%s since the last run, results reused from %s.manifest.json\n\n"%(reuse,analysis['spec_package']))
+        result=reused
+    elif(options['scenario_counting']):
+        counts=count_scenarios(pairs_array)
+        print("Scenarios of the subgraph counted on a tree decomposition of width %d"%counts['width'])
+        f.write("scenarios counted on a tree decomposition of width %d\n\n"%counts['width'])
+        result=empty_result()
+        result['counter_sat']=counts['counter_sat']
+        result['counter_unsat']=counts['counter_unsat']
+        result['avoided']=num_scenarios
+        result['relation_counts']=counts['relation_counts']
+    elif(cached is not None):
+        print("Scenarios of the subgraph found in the cache (%s)"%form['key'])
+        f.write("scenarios from the cache %s\n\n"%form['key'])
+        result=cached
+    else:
+        enumeration=options['enumeration']
+        path_consistency=options['path_consistency']
+        log=analysis['log']
+        #scenarios [0,next_index) have been checked by a previous run (see checkpoint.py)
+        next_index,done=resume_subgraph(analysis['checkpoint'], subgraph_id, pairs_array, num_scenarios)
+        #a subgraph in the checkpoint has its header in the log (and in the .out) kept by
+        #truncate_to_checkpoint: it is written once, else the reader numbers it twice
+        resumed=next_index>0
+        if(next_index<num_scenarios and enumeration=="allsat"):
+            #allsat cannot start from a given scenario
+            next_index,done=0,empty_result()
+        if(next_index>0):
+            print("Resume from scenario %d of %d"%(next_index+1,num_scenarios))
+            f.write("resume from scenario %d\n\n"%(next_index+1))
+        if(log is not None and not resumed):
+            write_subgraph(log, subgraph_id, pairs_array)
+            f.write("scenarios logged in %s.scenarios.jsonl\n\n"%analysis['spec_package'])
+        on_checkpoint=subgraph_checkpointer(analysis['checkpoint_file'], analysis['checkpoint'], subgraph_id, pairs_array, num_scenarios, done, options['checkpoint_interval'], [f]+([log['file']] if log is not None else []))
+
+        if(next_index==num_scenarios):
+            result=empty_result()
+        elif(options['enumeration_workers']>1 and enumeration!="allsat"):
+            print("Check scenarios with %d worker processes"%options['enumeration_workers'])
+            f.flush()
+            result=check_scenarios_parallel(sub_pairs_num, len(pairs_array), f, os.path.join(analysis['path'],analysis['spec_package']+".out"), options['enumeration_workers'], prefilter=path_consistency, engine=enumeration, learning=options['conflict_learning'], assumptions=options['assumption_literals'], on_checkpoint=on_checkpoint, start=next_index, track=track_theory, log=log)
+        else:
+            # add topology theory to solver (not needed if path consistency decides every scenario)
+            if(path_consistency not in DECIDING_PREFILTERS and not prepared['theory']):
+                print("Create Topological structure, RCC5 Theory + unfolding quantifiers")
+                rcc_five(solver, regions_subregions_pairs['regions'].union(regions_subregions_pairs['subregions']), theory['P'], theory['O'], theory['EQ'], theory['PP'], theory['PO'], theory['PPi'], theory['DR'], track=track_theory)
+                prepared['theory']=True
+
+            result=ENGINES[enumeration](solver, theory, pairs_array, next_index, num_scenarios, f, prefilter=path_consistency, learning=options['conflict_learning'], assumptions=options['assumption_literals'], on_checkpoint=on_checkpoint, core_solver=None if track_theory else tracked_solver(sub_pairs_num, theory), log=log)
+        result=merge_results(merge_results(empty_result(),done),result)
+        if(options['subgraph_cache']):
+            store_subgraph(analysis['cache_dir'], form, result, analysis['cache_memory'])
+    analysis['reuse'][reuse or "analyzed"]+=1
+    record_subgraph(analysis['manifest'], subgraph_id, pairs_array, form, mode, result)
+
+    statistics="\n********\nSTATISTICS\n\nscenarios=%d\nsat=%d\nunsat=%d"%(num_scenarios,result['counter_sat'],result['counter_unsat'])
+
+    if(result['counter_unknown'] != 0):
+        #This should never happen
+        statistics+="\nUNKNOWN=%d"%result['counter_unknown']
+    statistics+="\nsolver calls=%d"%result['checks']
+    if(result['checks']>0 and 'check_time' in result):
+        statistics+="\navg check latency=%.6fs"%(result['check_time']/result['checks'])
+    statistics+="\nsolver calls avoided=%d"%result['avoided']
+    if(options['enumeration']=="backtracking"):
+        statistics+="\npruned subtrees=%d"%result.get('pruned',0)
+    if(options['conflict_learning']):
+        statistics+="\nnogoods learned=%d\nnogood hits=%d\nnogood misses=%d"%(result['nogoods'],result['nogood_hits'],result['checks'])
+        print("Nogoods learned: %d, hits: %d, misses (solver calls): %d"%(result['nogoods'],result['nogood_hits'],result['checks']))
+        nogoods=analysis['nogoods']
+        nogoods['learned']+=result['nogoods']
+        nogoods['hits']+=result['nogood_hits']
+        nogoods['misses']+=result['checks']
+    print("Solver calls avoided by path consistency: %d of %d"%(result['avoided'],num_scenarios))
+    f.write("%s\n"%statistics)
+    if(analysis['solvers'] is None):
         solver.pop()
-    
-        counter+=1
-    
-        end = time.time()
-        sum_time+=(end - start)
-        avg_time=(sum_time/counter)
+    return {'pairs_array':pairs_array,'result':result}
+
+#returns {'spec_package','path','components','registry','num_pairs','subgraphs','cyclic',
+# 'risk_structure','cyclic_risk_struct','risk','reuse','nogoods','timings','seconds'} where subgraphs is the
+#summary of the subgraphs (see decompose), cyclic has {'subgraph','pairs','blocks','sat'}
+#per cyclic subgraph, risk is the total risk of the report (see write_report) and reuse counts
+#the cyclic subgraphs (and blocks) unchanged, isomorphic, analyzed and removed since the last run.
+#nogoods has the totals {'learned','hits','misses'} of the cyclic subgraphs with conflict_learning (else None).
+#options overrides some of the default_options, resume continues from the last checkpoint
+#in path and theory (see declare_theory) can be shared by the analyses of a process.
+#components_flows is the package already parsed (see get_packages_from_xmi, it is
+#modified by the analysis), otherwise it is parsed from xmi_filename. solvers is a dict
+#where a long running process keeps the solvers of the cyclic subgraphs with their
+#theory between its analyses (see prepare_block_solver), it needs the same theory
+def analyze(xmi_filename,spec_package,path,options=None,resume=False,theory=None,components_flows=None,solvers=None):
+    start=time.time()
+    first_timing=len(phase_timings())
+    analysis_options=default_options()
+    analysis_options.update(options or {})
+    options=analysis_options
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    solver=Solver()
+    if(theory is None):
+        theory=declare_theory()
+
+    print("1. Parse package %s in %s and calculate Bases"%(spec_package,xmi_filename))
+    model=load_model(xmi_filename,spec_package,path,theory['Base'],options['model_cache'],components_flows)
+    components=model['components']
+    registry=model['registry']
+    #TODO generate a json  
+    f=open(os.path.join(path,spec_package+"_model.out"),"w+")
+    pprint.pprint(components,f)
+    f.close()
 
-    statistics="\n********\nSTATISTICS\n\nscenarios=%d\nsat=%d\nunsat=%d"%(counter-1,counter_sat,counter_unsat)
+    print("2. Calculate pairs and generate graph")
+    pairs_num=generate_graph(path,spec_package,components,registry)
+
+    print("3. Analyze graph")
+    checkpoint_file=checkpoint_filename(path,spec_package)
+    if(resume):
+        checkpoint=load_checkpoint(checkpoint_file,spec_package)
+        #the .out and the scenario log are cut where the checkpoint was saved (see checkpoint.py)
+        truncate_to_checkpoint(checkpoint)
+        f=open(os.path.join(path,spec_package+".out"),"a+")
+        f.write("\nRESUMED FROM CHECKPOINT\n")
+    else:
+        checkpoint=new_checkpoint(spec_package)
+        f=open(os.path.join(path,spec_package+".out"),"w+")
+    f.write("spec: %s\n"%spec_package)
+    f.write("pairs of regions: %s\n"%str(pairs_num['num_pairs']))
+
+    #decompose in disconnected subgraphs (the connected components of the
+    #undirected graph of the pairs) and detect which of them contain cycles
+    #(see graph_decomposition.py)
+    subgraphs=decompose(pairs_num['pairs'])
+    f.write("subgraphs: %d (cyclic: %d, acyclic: %d)\n"%(len(subgraphs['summary']),len(subgraphs['cycle']),len(subgraphs['acycle'])))
+    for i,summary in enumerate(subgraphs['summary']):
+        f.write("subgraph %d: nodes=%d pairs=%d cyclomatic number=%d\n"%(i+1,summary['nodes'],summary['edges'],summary['cyclomatic']))
+    counter=0
+    #risk_structure{ relation:{pair:weight} }
+    risk_structure={'po':{},'pp':{},'ppi':{},'dr':{}}
+
+    #suppose rcc5
+    # Cyclic and acyclic sub-graphs CG_1,...,CG_n,AG_1,...,AG_n do not affect each others.
+    # We can see them as independet parts of a combination. If each sub-graph had only 5 configurations
+    # representing a sub-part of a scenario, the number of possible scenarios would be 5^{#sub-graphs}=5^{2n}.
+    # When a subgraph is removed, to calculate the new number of possible scenarios 1 needs to be
+    # removed at the exponent (e.g. removing 1 sub-graph results in 5^{2n-1}.
+    # If each acyclic sub-graph has M relations of arity 5, those relations are independent (do not affect each other)
+    # therefore, the number of combination 5^M. With N acyclic sub-graphs, each with M relations with arity 5 we have
+    # 5^M^N=5^{M*N} scenarios; removing 1 relation would result in 5^{(M*N)-1} scenarios
+
+    if(subgraphs['acycle']!=[]):
+        print("FOUND %d SIMPLE (ACYCLICAL) STRUCTURE(S)"%len(subgraphs['acycle']))
+
+    for s in subgraphs['acycle']:
+        subgraph_id=str(s)
+        f.write("\nSIMPLE ACYCLIC SUBGRAPHS (Any relation in RCC5 holds and do not affect the rest of the model)\n")
+
+        # suppose node1 -- node2 -- node3 represented as [node1 node2 node3]
+        # if the number of insecurity relations between 2 nodes are 4 we have
+        # 4*4=4^2 combinations/configurations. If I mitigate one of the relations 
+        # I have 3*4 combinations; so, (1+1+1+1)*(1+1+1+1) becomes (0+1+1+1)*(1+1+1+1)
+        # and that mitigation reduces by 1*(1+1+1+1)=1*4=4
+        # If we have 4 nodes, we have 4*4*4 combinations; mitigating one results in
+        # 3*4*4 so we reduced by 1*4*4. This is not a proof but an example to show that
+        # the mitigation weight is proportional to the number of relations. 
+        # Therefore, the weight (of mitigating a relation) is 
+        # weight = 1 * (insecurity_relations ** (total_num_of_relations_in_graph-1)) [in Python **=^]
+        # the number of relation can only be calculated after the following cycle (i.e. s only contains nodes, not the relations between them)
+        num_of_relations=0
+        tmp_risk_structure={'po':{},'pp':{},'ppi':{},'dr':{}}
+        for node in s:
+            if(node in pairs_num['pairs'].keys()):
+                f.write("%d [%s,%s]\n"%(counter, str(node), str(pairs_num['pairs'][node])))
+                for i in pairs_num['pairs'][node]:
+                    num_of_relations+=1
+                    tmp_risk_structure['po'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}}
+                    tmp_risk_structure['pp'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
+                    tmp_risk_structure['ppi'][(node,i)] = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
+                    tmp_risk_structure['dr'][(node,i)]  = {'direct_weight':None, 'type':"acyclic", 'indirect_weight':{'subgraph':subgraph_id,'tot_config':None}} 
+        for k,v in tmp_risk_structure.items():
+            for k1,v1 in v.items():
+                risk_structure[k][k1]=tmp_risk_structure[k][k1]
+                risk_structure[k][k1]['direct_weight']=(INSECURITY_CONFIGURATIONS**(num_of_relations-1))
+                risk_structure[k][k1]['indirect_weight']['tot_config']=(INSECURITY_CONFIGURATIONS**num_of_relations)
 
-    if(counter_unknown != 0):
-        #This should never happen
-        statistics+="\nUNKNOWN=%d"%unknown
-    f.write("%s\n"%statistics)
-    cyclic_struct_counter+=1
-
-f.close()
-#pprint.pprint(risk_structure)
-#print("cyclyc risk struct")
-#pprint.pprint(cyclic_risk_struct)
-print("Write Excel Report")
-write_report(path,spec_package,risk_structure,cyclic_risk_struct,components)
+        counter+=1
+
+    print("Analysis on simple structures concluded and reported\n")
+
+    #in the case of cyclical structures we need to calculate the number of scenarios in which
+    # a relation appears
+
+    if(subgraphs['cycle']!=[]):
+        print("FOUND %d COMPLEX (CYCLICAL) STRUCTURE(S)\n"%len(subgraphs['cycle']))
+        f.write("\nCYCLYC SUBGRAPHS\n")
+
+    #in cyclic_risk_struct we explicitly save all the possible
+    # configurations of the cyclic subgraphs
+    # cyclic_risk_struct={subgraph_1 : {'pairs':[[a,b], [b,c], ...], 'scenarios':[[0, 0, ...] ... [...]]}}
+    # with the relation codes of each scenario packed in a uint8 matrix (see record_insecure_scenarios)
+    cyclic_risk_struct={}
+
+    manifest_file=manifest_filename(path,spec_package)
+    previous_manifest=load_manifest(manifest_file,spec_package) if options['incremental'] else new_manifest(spec_package)
+    log=None
+    if(options['scenario_log_format']=="jsonl"):
+        log=open_scenario_log(os.path.join(path,spec_package+".scenarios.jsonl"), "a" if resume else "w", options['scenario_log_results'])
+    analysis={'spec_package':spec_package,'path':path,'options':options,'theory':theory,'solver':solver,'solvers':solvers,'f':f,'log':log,
+        'checkpoint':checkpoint,'checkpoint_file':checkpoint_file,'cache_dir':os.path.join(path,"subgraph_cache"),'cache_memory':{},
+        'previous_manifest':previous_manifest,'manifest':new_manifest(spec_package),'reuse':{'unchanged':0,'isomorphic':0,'analyzed':0},
+        'nogoods':{'learned':0,'hits':0,'misses':0}}
+
+    cyclic=[]
+    cyclic_struct_counter=1
+    for s in subgraphs['cycle']:
+        subgraph_id=str(s)
+
+        f.write("Analyze structure %d\n"%cyclic_struct_counter)
+        print("Analyze structure %d\n"%cyclic_struct_counter)
+
+        sub_pairs_num={}
+        for node in s:
+            if(node in pairs_num['pairs'].keys()):
+                sub_pairs_num[node]=pairs_num['pairs'][node]
+
+        #the biconnected blocks of the subgraph are enumerated on their own and combined
+        #by product (see graph_decomposition.py)
+        blocks=biconnected_blocks(sub_pairs_num) if options['split_blocks'] else [sub_pairs_num]
+        if(len(blocks)==1):
+            analyzed=analyze_block(analysis, subgraph_id, sub_pairs_num)
+            if(options['scenario_counting']):
+                record_scenario_counts(risk_structure, cyclic_risk_struct, subgraph_id, analyzed['pairs_array'], analyzed['result'])
+            else:
+                record_insecure_scenarios(risk_structure, cyclic_risk_struct, subgraph_id, analyzed['pairs_array'], analyzed['result']['insecure'])
+            cyclic.append({'subgraph':subgraph_id,'pairs':len(analyzed['pairs_array']),'blocks':1,'sat':analyzed['result']['counter_sat']})
+        else:
+            f.write("biconnected blocks: %d (pairs: %s)\n\n"%(len(blocks),", ".join(str(sum(len(adj) for adj in block.values())) for block in blocks)))
+            analyzed=[]
+            for i,block in enumerate(blocks):
+                block_nodes=[]
+                for n,adj in block.items():
+                    for m in [n]+adj:
+                        if(m not in block_nodes):
+                            block_nodes.append(m)
+                f.write("Analyze block %d of structure %d\n"%(i+1,cyclic_struct_counter))
+                print("Analyze block %d of %d\n"%(i+1,len(blocks)))
+                analyzed.append((str(block_nodes),analyze_block(analysis, str(block_nodes), block, "_b%d"%(i+1))))
+            sats=[a['result']['counter_sat'] for block_id,a in analyzed]
+            for i,(block_id,a) in enumerate(analyzed):
+                if(options['scenario_counting']):
+                    record_scenario_counts(risk_structure, cyclic_risk_struct, block_id, a['pairs_array'], a['result'], math.prod(sats[:i]+sats[i+1:]), subgraph_id)
+                else:
+                    record_insecure_scenarios(risk_structure, cyclic_risk_struct, block_id, a['pairs_array'], a['result']['insecure'], math.prod(sats[:i]+sats[i+1:]), subgraph_id)
+            num_pairs=sum(len(a['pairs_array']) for block_id,a in analyzed)
+            statistics="\n********\nSTATISTICS OF THE STRUCTURE\n\nscenarios=%d\nscenarios of the blocks=%d\nsat=%d"%(RCC_CONFIGURATIONS**num_pairs,sum(RCC_CONFIGURATIONS**len(a['pairs_array']) for block_id,a in analyzed),math.prod(sats))
+            f.write("%s\n"%statistics)
+            cyclic.append({'subgraph':subgraph_id,'pairs':num_pairs,'blocks':len(blocks),'sat':math.prod(sats)})
+        cyclic_struct_counter+=1
+
+    if(log is not None):
+        close_scenario_log(log)
+    save_manifest(manifest_file,analysis['manifest'])
+    reuse=dict(analysis['reuse'])
+    reuse['removed']=len(set(previous_manifest['subgraphs'])-set(analysis['manifest']['subgraphs']))
+    if(options['incremental'] and previous_manifest['subgraphs']):
+        incremental="\n********\nINCREMENTAL ANALYSIS\n\nunchanged=%d\nisomorphic=%d\nanalyzed=%d\nremoved=%d"%(reuse['unchanged'],reuse['isomorphic'],reuse['analyzed'],reuse['removed'])
+        f.write("%s\n"%incremental)
+        print("Subgraphs since the last run: %d unchanged, %d isomorphic, %d analyzed, %d removed"%(reuse['unchanged'],reuse['isomorphic'],reuse['analyzed'],reuse['removed']))
+    nogoods=dict(analysis['nogoods']) if options['conflict_learning'] else None
+    if(nogoods is not None):
+        learning="\n********\nCONFLICT LEARNING\n\nnogoods learned=%d\nnogood hits=%d\nnogood misses=%d"%(nogoods['learned'],nogoods['hits'],nogoods['misses'])
+        f.write("%s\n"%learning)
+        print("Nogoods of the cyclic subgraphs: %d learned, %d hits, %d misses (solver calls)"%(nogoods['learned'],nogoods['hits'],nogoods['misses']))
+
+    timings="\n********\nPHASE TIMINGS\n"
+    for timing in phase_timings()[first_timing:]:
+        timings+="\n%s: %d in %.3fs (%.1f/s)"%(timing['phase'],timing['done'],timing['seconds'],timing['rate'])
+    f.write("%s\n"%timings)
+    f.close()
+    #pprint.pprint(risk_structure)
+    #print("cyclyc risk struct")
+    #pprint.pprint(cyclic_risk_struct)
+    print("Write Excel Report")
+    risk=write_report(path,spec_package,risk_structure,cyclic_risk_struct,components,registry)
+    #the timings of this analysis are returned and forgotten (see clear_timings)
+    analysis_timings=phase_timings()[first_timing:]
+    clear_timings(first_timing)
+    return {'spec_package':spec_package,'path':path,'components':components,'registry':registry,'num_pairs':pairs_num['num_pairs'],
+        'subgraphs':subgraphs['summary'],'cyclic':cyclic,'risk_structure':risk_structure,'cyclic_risk_struct':cyclic_risk_struct,
+        'risk':risk,'reuse':reuse,'nogoods':nogoods,'timings':analysis_timings,'seconds':time.time()-start}
+
+if __name__ == "__main__":
+    parser=argparse.ArgumentParser(description="Cybersecurity risk assessment of the package %s in %s"%(spec_package,xmi_filename))
+    parser.add_argument("--resume", action="store_true", help="continue the enumeration of the cyclic subgraphs from the last checkpoint in output_secra")
+    parser.add_argument("--progress", choices=PROGRESS_MODES, default=progress_mode, help="how the progress of the analysis is shown (default %(default)s)")
+    args=parser.parse_args()
+    set_progress_mode(args.progress)
+
+    z3.set_param('parallel.enable', True)
+    z3.set_param('parallel.threads.max', 32)
+    analyze(xmi_filename,spec_package,os.path.join("./","output_secra"),resume=args.resume)
@@ -0,0 +1,119 @@
+#!/usr/bin/python3
+
+import os
+import json
+import hashlib
+from rcc5_algebra import INVERSE, constraint_network
+from scenarios import index_from_scenario, scenario_from_index, empty_result
+
+#change it when the theory (or the encoding of the scenarios) changes
+#so that the results cached by previous versions are not used
+CACHE_VERSION="rcc5-minimal-subregions-1"
+
+################################
+# CANONICAL FORM OF A SUBGRAPH
+# the result of a cyclic subgraph only depends on its shape: renaming the
+# regions, reordering the pairs or swapping the regions of a pair (R(X,Y) is
+# inverse(R)(Y,X)) gives the same sat scenarios. The canonical form labels the
+# regions with color refinement (each region is colored by its degree and then
+# by the colors of its neighbours until the colors are stable) and, when
+# regions cannot be told apart, by individualizing each of them in turn and
+# keeping the smallest list of edges
+################################
+def _refine(colors, adj):
+    while(True):
+        signatures=[(colors[v],tuple(sorted(colors[u] for u in adj[v]))) for v in range(len(adj))]
+        ranks={sig:i for i,sig in enumerate(sorted(set(signatures)))}
+        refined=[ranks[sig] for sig in signatures]
+        if(len(set(refined))==len(set(colors))):
+            return refined
+        colors=refined
+
+def _edges_with_labels(labels, edges):
+    return sorted((min(labels[a],labels[b]),max(labels[a],labels[b])) for a,b in edges)
+
+def _search(colors, adj, edges, best):
+    colors=_refine(colors, adj)
+    if(len(set(colors))==len(colors)):
+        encoding=_edges_with_labels(colors, edges)
+        if(best['encoding'] is None or encoding<best['encoding']):
+            best['encoding']=encoding
+            best['labels']=colors
+        return
+    #individualize each region of the first (smallest color) cell with more than one region
+    cells={}
+    for v,c in enumerate(colors):
+        cells.setdefault(c,[]).append(v)
+    cell=min(c for c,vs in cells.items() if len(vs)>1)
+    for v in cells[cell]:
+        individualized=[2*c+(1 if (c==cell and u!=v) else 0) for u,c in enumerate(colors)]
+        _search(individualized, adj, edges, best)
+
+#returns the canonical form of the subgraph pairs_array:
+# - key: hash of the canonical list of edges
+# - order: per canonical pair, (index in pairs_array, True if its regions are swapped)
+def canonical_form(pairs_array):
+    network=constraint_network(pairs_array)
+    edges=network['edges']
+    adj=[[] for i in range(network['num_nodes'])]
+    for a,b in edges:
+        adj[a].append(b)
+        adj[b].append(a)
+
+    best={'encoding':None,'labels':None}
+    _search([len(adj[v]) for v in range(len(adj))], adj, edges, best)
+    labels=best['labels']
+
+    order=sorted(range(len(edges)), key=lambda i:(min(labels[edges[i][0]],labels[edges[i][1]]),max(labels[edges[i][0]],labels[edges[i][1]]),i))
+    encoding="%s;%d;%s"%(CACHE_VERSION,network['num_nodes'],best['encoding'])
+    return {'key':hashlib.sha256(encoding.encode()).hexdigest(),'order':[(i,labels[edges[i][0]]>labels[edges[i][1]]) for i in order]}
+
+def to_canonical(t, order):
+    return tuple(INVERSE[t[i]] if swapped else t[i] for i,swapped in order)
+
+def from_canonical(t, order):
+    local=[0]*len(order)
+    for j,(i,swapped) in enumerate(order):
+        local[i]=INVERSE[t[j]] if swapped else t[j]
+    return tuple(local)
+
+################################
+# CACHE
+# one json file per canonical form in cache_dir (content addressed by its key)
+# with the counters and the sat insecure scenarios in canonical pair order
+################################
+def lookup_subgraph(cache_dir, form, memory=None):
+    if(memory is not None and form['key'] in memory):
+        cached=memory[form['key']]
+    else:
+        filename=os.path.join(cache_dir,form['key']+".json")
+        if(not os.path.exists(filename)):
+            return None
+        with open(filename) as f:
+            cached=json.load(f)
+        if(memory is not None):
+            memory[form['key']]=cached
+    num_pairs=len(form['order'])
+    result=empty_result()
+    for k in ('counter_sat','counter_unsat','counter_unknown'):
+        result[k]=cached[k]
+    insecure=[from_canonical(scenario_from_index(i,num_pairs),form['order']) for i in cached['insecure']]
+    #in enumeration order, as if the scenarios of this subgraph had been checked
+    result['insecure']=sorted(insecure)
+    return result
+
+#results with unknown scenarios are not cached
+def store_subgraph(cache_dir, form, result, memory=None):
+    if(result['counter_unknown']!=0):
+        return
+    cached={k:result[k] for k in ('counter_sat','counter_unsat','counter_unknown')}
+    cached['insecure']=sorted(index_from_scenario(to_canonical(t,form['order'])) for t in result['insecure'])
+    if(memory is not None):
+        memory[form['key']]=cached
+    #the analyses of a batch (see batch.py) can store in the same cache_dir
+    os.makedirs(cache_dir,exist_ok=True)
+    filename=os.path.join(cache_dir,form['key']+".json")
+    tmp_filename="%s.%d.tmp"%(filename,os.getpid())
+    with open(tmp_filename,"w") as f:
+        json.dump(cached,f)
+    os.replace(tmp_filename,filename)